@@ -20,6 +20,7 @@ class DiagnosticState(TypedDict):
     input: str                                          # User's diagnostic query
     plan: List[str]                                     # List of execution steps
     past_steps: Annotated[List[Tuple], operator.add]   # History of (step, result) pairs
+    past_step_summaries: Annotated[List[str], operator.add]  # One-line summary per past step (for the replanner)
     response: str                                       # Final diagnostic answer
     ready_for_synthesis: bool                           # Signal for synthesizer routing
     
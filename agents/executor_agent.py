@@ -1,11 +1,32 @@
 # agents/executor_agent.py
+import asyncio
 from .diagnostic_state import DiagnosticState
 from .scada_agent import ScadaAgent
 from .manual_agent import ManualAgent
+from .replan_agent import summarize_step
+from .utils import logger, ResponseCache, STEP_PREFIX_RE, step_words
+
+# Words that route an unprefixed step to SCADA (whole-word match on the step's tokens)
+_SCADA_TOKENS = frozenset({
+    "sensor", "sensors", "pressure", "temperature", "data", "reading", "readings",
+    "current", "vibration", "rpm", "load", "error", "errors"
+})
+
+# Failure texts from the tool agents and from inside the tools (SQL/Groq errors come back as
+# "❌ ..."/"⚠️ ..." strings); a manual result carries its explanation after the AI Analysis header
+_ERROR_PREFIXES = ("SCADA error", "Manual search error", "Error processing custom SCADA data", "❌", "⚠️")
+_AI_ANALYSIS_HEADER = "🤖 AI Analysis:\n"
+
+def _is_error_result(result: str) -> bool:
+    """True if a tool result reports a failure that should be retried rather than cached"""
+    if result.startswith(_ERROR_PREFIXES):
+        return True
+    _, header, explanation = result.partition(_AI_ANALYSIS_HEADER)
+    return bool(header) and explanation.startswith(_ERROR_PREFIXES)
 
 class ExecutorAgent:
     """
-    Executor Agent: Executes a single step of the diagnostic plan by delegating to
+    Executor Agent: Executes the next step(s) of the diagnostic plan by delegating to
     the appropriate specialized tool agent (SCADA or Manual).
     """
     def __init__(self, scada_agent: ScadaAgent, manual_agent: ManualAgent):
@@ -13,47 +34,101 @@ class ExecutorAgent:
         self.scada_agent = scada_agent
         self.manual_agent = manual_agent
 
-    def execute_step(self, state: DiagnosticState) -> dict:
+        # Repeated queries reuse earlier tool results; manual searches also match near-identical
+        # wording via the manual tool's memoized (normalized) query embeddings. SCADA stays
+        # exact-match because similar phrasings can ask for different months or sensors.
+        # The cache embeds the same preprocessed text search() does, so a cache miss followed
+        # by the actual search costs one encoder pass, not two.
+        manual_tool = getattr(manual_agent, "manual_tool", None)
+        self.result_cache = ResponseCache(
+            embed=manual_tool.embed_search_query if manual_tool is not None else None,
+            semantic_namespaces=("MANUAL",)
+        )
+
+    def _resolve_tool(self, step_task: str):
+        """Returns (tool_used, tool_function) for a plan step"""
+        # Determine which agent to use based on the step prefix
+        prefix_match = STEP_PREFIX_RE.match(step_task)
+        tool_prefix = prefix_match.group(1) if prefix_match else None
+        if tool_prefix == "SCADA":
+            # The SCADA agent's query method expects the context or specific query for SCADA
+            # We're passing the original user_initial_query as it seems to be what query_scada expects.
+            return "SCADA", self.scada_agent.query
+        elif tool_prefix == "MANUAL":
+            # The Manual agent's search method expects the context or specific query for manuals
+            # We're passing the original user_initial_query as it seems to be what manual_tool expects.
+            return "MANUAL", self.manual_agent.search
+        # Fallback logic for auto-detection, as seen in original plan_execute_graph.py
+        # This logic should ideally be refined by the planner for explicit prefixes.
+        if not _SCADA_TOKENS.isdisjoint(step_words(step_task)):
+            return "SCADA (auto-detected)", self.scada_agent.query
+        return "MANUAL (auto-detected)", self.manual_agent.search
+
+    def _independent_steps(self, plan: list) -> list:
+        """
+        Leading plan steps that can run together: each tool is fed the original user
+        query, so steps only depend on each other when they hit the same tool.
+        """
+        batch = []
+        tools_in_batch = set()
+        for step_task in plan:
+            tool_function = self._resolve_tool(step_task)[1]
+            if tool_function in tools_in_batch:
+                break
+            tools_in_batch.add(tool_function)
+            batch.append(step_task)
+        return batch
+
+    def _cached_tool_call(self, tool_name: str, tool_function, user_initial_query: str) -> str:
+        """Runs a tool through the result cache (called in a worker thread)"""
+        result = self.result_cache.get(tool_name, user_initial_query)
+        if result is not None:
+            logger.info(f"♻️ {self.name}: Reusing cached {tool_name} result")
+            return result
+
+        result = tool_function(user_initial_query)
+        # Tools report failures as text; don't keep those around
+        if not _is_error_result(result):
+            self.result_cache.set(tool_name, user_initial_query, result)
+        return result
+
+    async def _run_step(self, step_task: str, user_initial_query: str) -> tuple:
+        """Runs one plan step and returns its (step, result) pair"""
+        logger.debug(f"🔧 {self.name}: Executing step: '{step_task}'")
+
+        tool_used, tool_function = self._resolve_tool(step_task)
+        # SCADA (SQLite) and manual (vector store) lookups are blocking, so run them in a worker
+        # thread to keep the event loop free for API polling and the other gathered steps
+        result = await asyncio.to_thread(self._cached_tool_call, tool_used.split()[0], tool_function, user_initial_query)
+
+        logger.info(f"✅ {self.name}: Step '{step_task}' completed using {tool_used}.")
+        return (step_task, result)
+
+    async def execute_step(self, state: DiagnosticState) -> dict:
         """
-        Executes the current step in the plan and returns the result.
-        Assumes the first step in state["plan"] is the one to execute.
+        Executes the next step(s) in the plan and returns their results.
+        Consecutive steps that use different tools are executed concurrently;
+        the orchestrator removes len(past_steps) steps from the front of the plan.
         """
         plan = state["plan"]
         if not plan:
-            print(f"⚠️ {self.name}: No steps left in plan to execute.")
-            return {"past_steps": [("No steps in plan", "Execution completed or plan is empty")]}
+            logger.warning(f"⚠️ {self.name}: No steps left in plan to execute.")
+            empty_step = ("No steps in plan", "Execution completed or plan is empty")
+            return {"past_steps": [empty_step], "past_step_summaries": [summarize_step(*empty_step)]}
 
-        current_step_task = plan[0] # The current step to execute
         user_initial_query = state["input"] # Original user query for context if needed by tools
+        steps_to_run = self._independent_steps(plan)
 
-        print(f"🔧 {self.name}: Executing step: '{current_step_task}'")
+        if len(steps_to_run) > 1:
+            logger.info(f"⚡ {self.name}: Running {len(steps_to_run)} independent steps together")
 
-        result = ""
-        tool_used = "UNKNOWN"
+        executed_steps = await asyncio.gather(
+            *[self._run_step(step_task, user_initial_query) for step_task in steps_to_run]
+        )
 
-        # Determine which agent to use based on the step prefix
-        if current_step_task.startswith("SCADA:"):
-            tool_used = "SCADA"
-            # The SCADA agent's query method expects the context or specific query for SCADA
-            # We're passing the original user_initial_query as it seems to be what query_scada expects.
-            result = self.scada_agent.query(user_initial_query)
-
-        elif current_step_task.startswith("MANUAL:"):
-            tool_used = "MANUAL"
-            # The Manual agent's search method expects the context or specific query for manuals
-            # We're passing the original user_initial_query as it seems to be what manual_tool expects.
-            result = self.manual_agent.search(user_initial_query)
-        else:
-            # Fallback logic for auto-detection, as seen in original plan_execute_graph.py
-            # This logic should ideally be refined by the planner for explicit prefixes.
-            if any(word in current_step_task.lower() for word in ["sensor", "pressure", "temperature", "data", "reading", "current", "error code"]):
-                tool_used = "SCADA (auto-detected)"
-                result = self.scada_agent.query(user_initial_query)
-            else:
-                tool_used = "MANUAL (auto-detected)"
-                result = self.manual_agent.search(user_initial_query)
-
-        print(f"✅ {self.name}: Step '{current_step_task}' completed using {tool_used}.")
-
-        # Return the executed step and its result to be added to past_steps in the state
-        return {"past_steps": [(current_step_task, result)]}
\ No newline at end of file
+        # Return the executed steps and their results to be added to past_steps in the state,
+        # plus their compact summaries for the replanner
+        return {
+            "past_steps": list(executed_steps),
+            "past_step_summaries": [summarize_step(step, result) for step, result in executed_steps]
+        }
@@ -1,6 +1,7 @@
 # agents/manual_agent.py
 # Import the actual ManualSearchTool from your existing manual directory
 from manual.manual_search_tool import ManualSearchTool
+from .utils import logger
 
 class ManualAgent:
     """
@@ -16,7 +17,7 @@ class ManualAgent:
         The user_query here refers to the specific detail needed for the Manual tool,
         derived from the original overall user input or the current plan step.
         """
-        print(f"📖 {self.name}: Searching manuals for '{user_query}' (Top {top_k} results)...")
+        logger.debug(f"📖 {self.name}: Searching manuals for '{user_query}' (Top {top_k} results)...")
         try:
             search_results = self.manual_tool.search(user_query, top_k=top_k)
             
@@ -41,8 +42,8 @@ class ManualAgent:
             if ai_explanation:
                 result += f"\n\n🤖 AI Analysis:\n{ai_explanation}"
             
-            print(f"✅ {self.name}: Manual search successful.")
+            logger.debug(f"✅ {self.name}: Manual search successful.")
             return result
         except Exception as e:
-            print(f"❌ {self.name}: Manual search error: {str(e)}")
+            logger.error(f"❌ {self.name}: Manual search error: {str(e)}")
             return f"Manual search error: {str(e)}"
\ No newline at end of file
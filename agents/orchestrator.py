@@ -1,7 +1,7 @@
 # agents/orchestrator.py (COMPLETE FIXED VERSION WITH CONVERSATION SUPPORT)
 import copy
-import asyncio
 import time
+import orjson
 from datetime import datetime
 
 from typing import Dict, Any, Optional, List
@@ -11,7 +11,10 @@ from .executor_agent import ExecutorAgent
 from .scada_agent import ScadaAgent
 from .manual_agent import ManualAgent
 from .replan_agent import ReplanAgent
-from .synthesizer_agent import SynthesizerAgent
+from .synthesizer_agent import SynthesizerAgent, DETERMINISTIC_SYNTHESIS
+from .utils import post_groq_chat, logger
+from .prompts import CONTEXT_SUMMARY_SYSTEM_PROMPT
+import shared_decision
 
 class Orchestrator:
     """
@@ -61,7 +64,7 @@ class Orchestrator:
 
     async def _human_in_the_loop_review(self, state: DiagnosticState, duplicate_warning: bool = False, too_many_steps_warning: bool = False, replan_failed_warning: bool = False) -> Dict[str, Any]:
         """
-        Human review using shared decision file
+        Human review using the in-process shared decision (set by the API server)
         """
         print("\n--- HUMAN IN THE LOOP: Review Required ---")
         
@@ -105,20 +108,16 @@ class Orchestrator:
         print(" 'Synthesize': Force synthesis of a final answer now.")
         print(" 'Quit': Abort the workflow.")
 
-        # Wait for decision from shared file
+        # Wait for decision from the frontend
         print("⏳ Waiting for human decision from frontend...")
         
-        # Import shared decision
-        import shared_decision
-        
-        # Wait for decision in shared file
         max_wait_time = 300  # 5 minutes
-        wait_interval = 0.5  # Check every 0.5 seconds
+        status_interval = 10  # Report that we are still waiting every 10 seconds
         elapsed_time = 0
         
         while elapsed_time < max_wait_time:
-            # Check if decision is available in shared file
-            decision = shared_decision.get_decision()
+            # Wakes up as soon as the API server stores a decision
+            decision = await shared_decision.wait_for_decision(min(status_interval, max_wait_time - elapsed_time))
             if decision:
                 # Handle both old format (string) and new format (dict)
                 if isinstance(decision, dict):
@@ -136,11 +135,7 @@ class Orchestrator:
                 shared_decision.clear_decision()
 
                 # Clear the awaiting human input flag since we received a decision
-                try:
-                    import requests
-                    requests.post("http://localhost:8000/api/set-awaiting-human-input", json={"awaiting": False}, timeout=1)
-                except:
-                    pass  # Ignore if API call fails
+                shared_decision.set_awaiting_input(False)
 
                 if choice in ['c', 'continue']:
                     result = {"action": "continue"}
@@ -172,16 +167,13 @@ class Orchestrator:
                         result["feedback"] = feedback
                     return result
             
-            # Debug: Print what we're checking every 10 seconds
-            if int(elapsed_time) % 10 == 0 and elapsed_time > 0:
-                print(f"🔍 Still waiting... Decision in shared file: {decision}")
-            
-            # Wait before checking again
-            await asyncio.sleep(wait_interval)
-            elapsed_time += wait_interval
+            elapsed_time += status_interval
+            if elapsed_time < max_wait_time:
+                logger.debug(f"🔍 Still waiting... Decision in shared state: {decision}")
         
         # Timeout - force continue as fallback
         print("⏰ Timeout waiting for frontend decision, defaulting to continue...")
+        shared_decision.set_awaiting_input(False)
         return {"action": "continue"}
 
     async def run_diagnostic_workflow(self, initial_query: str) -> str:
@@ -199,6 +191,7 @@ class Orchestrator:
             "input": initial_query,
             "plan": [],
             "past_steps": [],
+            "past_step_summaries": [],
             "response": "",
             "ready_for_synthesis": False,
             "conversation_history": self.conversation_history,
@@ -214,7 +207,7 @@ class Orchestrator:
 
         # 1. Planner Step (with conversation context)
         print("\n--- Planner Step ---")
-        planner_output = self.planner_agent.create_plan(state)
+        planner_output = await self.planner_agent.create_plan(state)
         state["plan"] = planner_output.get("plan", [])
         if not state["plan"]:
             state["response"] = "The planner could not create a valid plan. Please try a different query."
@@ -234,12 +227,14 @@ class Orchestrator:
 
             if state["plan"]:
                 # 2. Executor Step
-                print("--- Executor Step ---")
-                executor_output = self.executor_agent.execute_step(state)
-                state["past_steps"] = state["past_steps"] + executor_output.get("past_steps", [])
-
-                # Remove the executed step from the plan
-                state["plan"] = state["plan"][1:]
+                logger.debug("--- Executor Step ---")
+                executor_output = await self.executor_agent.execute_step(state)
+                executed_steps = executor_output.get("past_steps", [])
+                state["past_steps"] = state["past_steps"] + executed_steps
+                state["past_step_summaries"] = state["past_step_summaries"] + executor_output.get("past_step_summaries", [])
+
+                # Remove the executed step(s) from the plan
+                state["plan"] = state["plan"][max(len(executed_steps), 1):]
                 if state["plan"]:
                     print(f"📋 Remaining plan steps: {state['plan']}")
                 else:
@@ -248,7 +243,7 @@ class Orchestrator:
             # 3. Replan Step
             print("\n--- Replan Step ---")
             
-            replan_output = self.replan_agent.decide_next_action(state)
+            replan_output = await self.replan_agent.decide_next_action(state)
 
             # Clear human feedback and edit mode flag after processing
             state.pop("human_feedback", None)
@@ -297,12 +292,8 @@ class Orchestrator:
                 if should_review:
                     print("🤝 HUMAN IN THE LOOP: Review Required")
                     
-                    # Set the awaiting human input flag in the API server
-                    try:
-                        import requests
-                        requests.post("http://localhost:8000/api/set-awaiting-human-input", json={"awaiting": True}, timeout=1)
-                    except:
-                        pass  # Ignore if API call fails
+                    # Let the API server report that we are waiting on the frontend
+                    shared_decision.set_awaiting_input(True)
                     
                     human_decision = await self._human_in_the_loop_review(state, duplicate_warning, too_many_steps_warning, replan_failed_warning)
                     
@@ -330,7 +321,7 @@ class Orchestrator:
                         if feedback_text:
                             print(f"✏️ {self.name}: Human chose to edit plan with feedback: {feedback_text}")
                             # Generate new plan using planner agent
-                            new_plan_output = self.planner_agent.create_plan_from_feedback(state, feedback_text)
+                            new_plan_output = await self.planner_agent.create_plan_from_feedback(state, feedback_text)
                             new_plan = new_plan_output.get("plan", [])
                             if new_plan:
                                 # Replace the current plan completely
@@ -346,7 +337,7 @@ class Orchestrator:
                         if feedback_text:
                             print(f"🔄 {self.name}: Human chose to continue with feedback: {feedback_text}")
                             # Use planner to modify existing plan based on feedback
-                            modified_plan_output = self.planner_agent.modify_plan_with_feedback(state, feedback_text)
+                            modified_plan_output = await self.planner_agent.modify_plan_with_feedback(state, feedback_text)
                             modified_plan = modified_plan_output.get("plan", [])
                             if modified_plan:
                                 # Replace the remaining plan with modified version
@@ -375,7 +366,7 @@ class Orchestrator:
                 if feedback_text:
                     print(f"✏️ {self.name}: Human chose to edit plan with feedback: {feedback_text}")
                     # Generate new plan using planner agent
-                    new_plan_output = self.planner_agent.create_plan_from_feedback(state, feedback_text)
+                    new_plan_output = await self.planner_agent.create_plan_from_feedback(state, feedback_text)
                     new_plan = new_plan_output.get("plan", [])
                     if new_plan:
                         # Replace the current plan completely
@@ -398,7 +389,7 @@ class Orchestrator:
                 if feedback_text:
                     print(f"🔄 {self.name}: Human chose to continue with feedback: {feedback_text}")
                     # Use planner to modify existing plan based on feedback
-                    modified_plan_output = self.planner_agent.modify_plan_with_feedback(state, feedback_text)
+                    modified_plan_output = await self.planner_agent.modify_plan_with_feedback(state, feedback_text)
                     modified_plan = modified_plan_output.get("plan", [])
                     if modified_plan:
                         # Replace the remaining plan with modified version
@@ -412,7 +403,9 @@ class Orchestrator:
         # 4. Synthesizer Step
         if state["ready_for_synthesis"] and not state["response"]:
             print("\n--- Synthesizer Step ---")
-            synthesizer_output = self.synthesizer_agent.synthesize_response(state)
+            synthesizer_output = await self.synthesizer_agent.synthesize_response(
+                state, deterministic=DETERMINISTIC_SYNTHESIS
+            )
             state["response"] = synthesizer_output.get("response", "An error occurred during final synthesis.")
             print(f"✅ {self.name}: Final response synthesized.")
         elif not state["response"]:
@@ -425,7 +418,7 @@ class Orchestrator:
             "user_query": initial_query,
             "diagnostic_steps": state["past_steps"],
             "final_response": state["response"],
-            "context_summary": self._generate_context_summary(state)
+            "context_summary": await self._generate_context_summary(state)
         }
         
         self._add_conversation_turn(conversation_turn)
@@ -434,45 +427,36 @@ class Orchestrator:
         print("=" * 60)
         return state["response"]
 
-    def _generate_context_summary(self, state: DiagnosticState) -> str:
+    async def _generate_context_summary(self, state: DiagnosticState) -> str:
         """Generate a summary of key findings for conversation context"""
         try:
             # Use Groq API to generate a concise summary
-            import requests
             import os
             
             groq_api_key = os.getenv("GROQ_API_KEY")
             if not groq_api_key:
                 return "Key findings from diagnostic analysis"
             
-            # Create summary prompt
-            summary_prompt = f"""Summarize the key findings from this diagnostic session in 2-3 sentences:
-
-User Query: {state['input']}
+            # Create summary prompt (session details only; the instructions are in the system prompt)
+            summary_prompt = f"""User Query: {state['input']}
 Steps Executed: {len(state['past_steps'])} diagnostic steps
-Final Response: {state['response'][:500]}...
-
-Provide a concise summary focusing on the most important findings and recommendations."""
+Final Response: {state['response'][:500]}..."""
 
-            response = requests.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {groq_api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
+            response = await post_groq_chat(
+                {
                     "model": "llama3-8b-8192",
                     "messages": [
-                        {"role": "system", "content": "You are a technical writer. Create concise, clear summaries of diagnostic findings."},
+                        {"role": "system", "content": CONTEXT_SUMMARY_SYSTEM_PROMPT},
                         {"role": "user", "content": summary_prompt}
                     ],
                     "temperature": 0.3,
                     "max_tokens": 150
-                }
+                },
+                api_key=groq_api_key
             )
             
             if response.status_code == 200:
-                return response.json()["choices"][0]["message"]["content"]
+                return orjson.loads(response.content)["choices"][0]["message"]["content"]
             else:
                 return "Key findings from diagnostic analysis"
                 
@@ -1,7 +1,83 @@
 # agents/replan_agent.py
-from typing import Literal
+from typing import Literal, List, Tuple
+import functools
+import hashlib
+import re
+import orjson
+import tiktoken
 from .diagnostic_state import DiagnosticState
-from .utils import call_groq_structured, Act, Response, Plan # Import relevant models and Groq helper
+from .utils import call_groq_structured, Act, Response, Plan, GROQ_CHAT_URL, groq_session, split_step # Import relevant models and Groq helpers
+from .prompts import REPLANNER_INSTRUCTIONS, FEEDBACK_ANALYSIS_SYSTEM_PROMPT
+
+# Tokenizer used to size past-step results for the replanner prompt
+_ENC = tiktoken.get_encoding("cl100k_base")
+RESULT_TOKEN_LIMIT = 60          # Tokens kept per step result
+REPLAN_WINDOW = 3                # Most recent steps shown to the replanner
+
+# Emoji and other non-ASCII glyphs cost several BPE tokens each and carry nothing for the replanner
+_NON_ASCII_RE = re.compile(r"[^\x00-\x7f]+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Near-duplicate detection between consecutive step results
+SHINGLE_WORDS = 5                # Words per shingle
+NEAR_DUPLICATE_JACCARD = 0.9     # Shingle overlap above which two results count as the same
+
+@functools.lru_cache(maxsize=64)
+def _result_signature(result: str) -> tuple:
+    """(content hash, word-shingle set) of a case/whitespace-normalized step result"""
+    words = result.lower().split()
+    digest = hashlib.blake2b(" ".join(words).encode(), digest_size=8).digest()
+    shingles = frozenset(
+        " ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))
+    )
+    return digest, shingles
+
+def results_are_duplicates(result_a, result_b) -> bool:
+    """
+    True when two step results are identical after normalization (hash compare) or
+    near-identical (Jaccard similarity of their 5-word shingles above NEAR_DUPLICATE_JACCARD).
+    """
+    hash_a, shingles_a = _result_signature(str(result_a))
+    hash_b, shingles_b = _result_signature(str(result_b))
+    if hash_a == hash_b:
+        return True
+    if not shingles_a or not shingles_b:
+        return False
+    return len(shingles_a & shingles_b) / len(shingles_a | shingles_b) > NEAR_DUPLICATE_JACCARD
+
+def _compact_text(text: str) -> str:
+    """ASCII-only, single-line version of a step or result"""
+    return _WHITESPACE_RE.sub(" ", _NON_ASCII_RE.sub("", str(text))).strip()
+
+def summarize_step(step: str, result) -> str:
+    """
+    Canonical one-line summary of an executed step for the replanner prompt:
+    "[TOOL] step=<description>; result=<first RESULT_TOKEN_LIMIT tokens>".
+    The executor records these as steps finish so replans don't re-process raw results.
+    """
+    tool, description = split_step(step)
+    result_tokens = _ENC.encode(_compact_text(result))[:RESULT_TOKEN_LIMIT]
+    return f"[{tool or 'UNKNOWN'}] step={_compact_text(description)}; result={_ENC.decode(result_tokens)}"
+
+def format_completed_steps(past_steps: List[Tuple], step_summaries: List[str] = None) -> str:
+    """
+    Build the completed-steps section of the replanner prompt from the last REPLAN_WINDOW
+    steps, so the prompt stays the same size however many steps have run. Summaries recorded
+    at execution time are reused; they are rebuilt here only if they don't line up with past_steps.
+    """
+    if not past_steps:
+        return ""
+
+    if step_summaries is None or len(step_summaries) != len(past_steps):
+        step_summaries = [None] * len(past_steps)
+
+    first = max(0, len(past_steps) - REPLAN_WINDOW)
+    lines = [
+        f"{i+1}. {step_summaries[i] or summarize_step(*past_steps[i])}"
+        for i in range(first, len(past_steps))
+    ]
+    completed_steps_str = f"... [{first} earlier steps omitted]\n" if first else ""
+    return completed_steps_str + "\n".join(lines)
 
 class ReplanAgent:
     """
@@ -21,7 +97,6 @@ class ReplanAgent:
         try:
             # Use Groq API for intelligent feedback processing
             import os
-            import requests
 
             groq_api_key = os.getenv("GROQ_API_KEY")
             if not groq_api_key:
@@ -46,63 +121,37 @@ Previous steps completed:
             if current_plan:
                 current_plan_text = f"\n\nCURRENT PLANNED STEPS (DO NOT SUGGEST THESE AGAIN):\n" + "\n".join([f"- {step}" for step in current_plan])
 
-            feedback_prompt = f"""You are an expert industrial diagnostic assistant. Analyze this human feedback and convert it into specific diagnostic actions.
-
-HUMAN FEEDBACK: "{feedback}"
+            # Per-call part of the feedback analysis; the JSON format and example live in
+            # FEEDBACK_ANALYSIS_SYSTEM_PROMPT so they form a cacheable prefix
+            feedback_prompt = f"""HUMAN FEEDBACK: "{feedback}"
 
 CONTEXT:
-{current_state_context}{current_plan_text}
-
-IMPORTANT: Respond ONLY with a valid JSON object. Do not include any other text, explanations, or markdown formatting.
-
-JSON FORMAT:
-{{
-    "primary_action": "Main action to take (e.g., analyze_pressure_data, check_temperature_correlations, search_error_codes)",
-    "suggested_steps": ["Step 1", "Step 2", "Step 3"],
-    "focus_areas": ["area1", "area2"],
-    "time_scope": "time period mentioned (e.g., last_24_hours, weekly, monthly, or empty string)",
-    "tool_preference": "preferred tools (e.g., SCADA, MANUAL, or empty string)",
-    "analysis_depth": "basic|detailed|comprehensive",
-    "feedback_summary": "brief summary of the feedback"
-}}
-
-EXAMPLE RESPONSE:
-{{
-    "primary_action": "analyze_pressure_data",
-    "suggested_steps": ["SCADA: Check pressure sensor readings", "SCADA: Analyze pressure trends"],
-    "focus_areas": ["pressure", "sensors"],
-    "time_scope": "last_24_hours",
-    "tool_preference": "SCADA",
-    "analysis_depth": "detailed",
-    "feedback_summary": "Analyze pressure data more carefully"
-}}
-
-JSON ONLY:"""
-
-            response = requests.post(
-                "https://api.groq.com/openai/v1/chat/completions",
+{current_state_context}{current_plan_text}"""
+
+            response = groq_session.post(
+                GROQ_CHAT_URL,
                 headers={
                     "Authorization": f"Bearer {groq_api_key}",
                     "Content-Type": "application/json"
                 },
-                json={
+                data=orjson.dumps({
                     "model": "llama3-8b-8192",
                     "messages": [
-                        {"role": "system", "content": "You are an expert industrial diagnostic assistant. Analyze human feedback and convert it into specific diagnostic actions. Always respond with valid JSON."},
+                        {"role": "system", "content": FEEDBACK_ANALYSIS_SYSTEM_PROMPT},
                         {"role": "user", "content": feedback_prompt}
                     ],
                     "temperature": 0.2,
                     "max_tokens": 300
-                }
+                }),
+                timeout=30
             )
 
             if response.status_code == 200:
-                result = response.json()["choices"][0]["message"]["content"]
+                result = orjson.loads(response.content)["choices"][0]["message"]["content"]
 
                 # Parse JSON response
                 try:
-                    import json
-                    feedback_analysis = json.loads(result)
+                    feedback_analysis = orjson.loads(result)
 
                     return {
                         "feedback_processed": True,
@@ -114,7 +163,7 @@ JSON ONLY:"""
                         "analysis_depth": feedback_analysis.get("analysis_depth", "basic"),
                         "feedback_summary": f"Human feedback: {feedback}"
                     }
-                except json.JSONDecodeError:
+                except orjson.JSONDecodeError:
                     return self._fallback_feedback_processing(feedback, state)
             else:
                 return self._fallback_feedback_processing(feedback, state)
@@ -235,7 +284,7 @@ JSON ONLY:"""
             "feedback_summary": f"Human feedback: {feedback}"
         }
 
-    def decide_next_action(self, state: DiagnosticState) -> dict:
+    async def decide_next_action(self, state: DiagnosticState) -> dict:
         """
         Determines whether to continue executing the plan, synthesize a final answer,
         or end the process, based on the current state and past steps.
@@ -251,11 +300,11 @@ JSON ONLY:"""
         duplicate_warning = ""
         force_synthesis = False
         if len(state["past_steps"]) >= 2:
-            last_result = state["past_steps"][-1][1][:200]
-            previous_result = state["past_steps"][-2][1][:200]
+            last_result = state["past_steps"][-1][1]
+            previous_result = state["past_steps"][-2][1]
 
-            # Simple duplicate detection
-            if last_result.lower().strip() == previous_result.lower().strip():
+            # Hash compare first, then shingle overlap to catch a tool returning the same text reworded slightly
+            if results_are_duplicates(last_result, previous_result):
                 duplicate_warning = """
 🚨 CRITICAL: The last step returned IDENTICAL results to the previous step.
 This means you're asking the same tool for the same information repeatedly.
@@ -265,9 +314,7 @@ This is a hard requirement to prevent infinite loops."""
                 force_synthesis = True
 
         # Build complete context showing what we've actually accomplished (logic from original replan_step)
-        completed_steps_str = ""
-        for i, (step, result) in enumerate(state["past_steps"]):
-            completed_steps_str += f"{i+1}. {step}\nResult: {result[:200]}...\n\n"
+        completed_steps_str = format_completed_steps(state["past_steps"], state.get("past_step_summaries"))
 
         # Show remaining steps from current plan (if any) (logic from original replan_step)
         remaining_steps_str = ""
@@ -284,10 +331,9 @@ This is a hard requirement to prevent infinite loops."""
         # All human feedback is now processed by the orchestrator using the planner
         # This ensures better plan coherence and step limit management
 
-        # Build the replanner prompt (always defined outside conditional blocks)
-        replanner_prompt = f"""For the given objective, decide if you need more steps or can provide final answer.
-
-USER QUESTION: {state["input"]}
+        # Build the replanner prompt (always defined outside conditional blocks); only the
+        # per-call state goes here, the static decision rules live in REPLANNER_INSTRUCTIONS
+        replanner_prompt = f"""USER QUESTION: {state["input"]}
 
 COMPLETED STEPS:
 {completed_steps_str}
@@ -296,26 +342,7 @@ COMPLETED STEPS:
 {duplicate_warning}
 {feedback_context}
 
-DECISION ANALYSIS:
-- You have completed {len(state["past_steps"])} steps.
-- For simple "What is X?" questions, 1-2 steps are usually sufficient.
-- For diagnostic "X is wrong, what do I do?" questions, you need both SCADA data and MANUAL procedures.
-
-Decision options:
-1. If you have sufficient information to answer the user's question comprehensively:
-   Respond with: {{"action": {{"response": "SYNTHESIZE"}}}}
-
-2. If you still need critical missing information (maximum 1-2 more steps):
-   Respond with: {{"action": {{"steps": ["TOOL: specific missing info"]}}}}
-
-CRITICAL RULES:
-- For "What is pressure in March?" → SCADA data alone is sufficient → SYNTHESIZE
-- Don't ask for "more specific" data if you already have comprehensive data.
-- If you have SCADA readings, you have ALL available sensor data from SCADA.
-- If results are repeating, choose "SYNTHESIZE".
-- Maximum 3 total execution steps (including past and planned future) recommended.
-
-Respond with JSON only."""
+You have completed {len(state["past_steps"])} steps."""
 
         try:
             # If duplicates detected, warn but let human decide
@@ -323,7 +350,7 @@ Respond with JSON only."""
                 # Don't force synthesis - let human decide in the review
                 return {"duplicate_warning": True}
 
-            output = call_groq_structured(replanner_prompt, Act)
+            output = await call_groq_structured(replanner_prompt, Act, instructions=REPLANNER_INSTRUCTIONS)
 
             if isinstance(output, Response):
                 if output.response == "SYNTHESIZE":
@@ -1,6 +1,7 @@
 # agents/scada_agent.py
 # Import the actual SCADA query tool from your existing scada directory
 from scada.scada_query_tool import query_scada
+from .utils import logger
 
 class ScadaAgent:
     """
@@ -15,12 +16,12 @@ class ScadaAgent:
         The user_query here refers to the specific detail needed for the SCADA tool,
         derived from the original overall user input or the current plan step.
         """
-        print(f"📊 {self.name}: Querying SCADA for '{user_query}'...")
+        logger.debug(f"📊 {self.name}: Querying SCADA for '{user_query}'...")
         try:
             # Call your actual SCADA query function
             result = query_scada(user_query)
-            print(f"✅ {self.name}: SCADA query successful.")
+            logger.debug(f"✅ {self.name}: SCADA query successful.")
             return result
         except Exception as e:
-            print(f"❌ {self.name}: SCADA error during query: {str(e)}")
+            logger.error(f"❌ {self.name}: SCADA error during query: {str(e)}")
             return f"SCADA error: {str(e)}"
\ No newline at end of file
@@ -1,11 +1,14 @@
 # agents/synthesizer_agent.py
 # agents/synthesizer_agent.py
 import os
-import json
-import requests
+import sys
+import orjson
 # from dotenv import load_dotenv # Already loaded in utils.py
 
 from .diagnostic_state import DiagnosticState
+import httpx
+from .utils import stream_groq_chat, ResponseCache, split_step
+from .prompts import SYNTHESIZER_SYSTEM_PROMPT
 
 # Load environment variable for API key if not already loaded globally by utils.py
 # (It's good practice to ensure it's loaded where used, or rely on global setup)
@@ -15,6 +18,10 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY") # Changed back to GROQ_API_KEY
 if not GROQ_API_KEY:
     raise ValueError("GROQ_API_KEY environment variable not set. Please set it in your .env file.")
 
+SYNTHESIS_TEMPERATURE = 0.3  # Used for non-deterministic (uncached) synthesis
+# Opt-in: run synthesis at temperature 0 and cache answers for identical findings
+DETERMINISTIC_SYNTHESIS = os.getenv("SENTIENTGRID_DETERMINISTIC_SYNTHESIS", "").lower() in ("1", "true", "yes")
+
 class SynthesizerAgent:
     """
     Synthesizer Agent: Analyzes all gathered information and creates a comprehensive
@@ -23,74 +30,71 @@ class SynthesizerAgent:
     def __init__(self):
         self.name = "SynthesizerAgent"
         self.groq_api_key = GROQ_API_KEY # Store for direct use
+        # Same question over the same step results -> same answer (deterministic calls only)
+        self.response_cache = ResponseCache(maxsize=128, ttl=3600)
 
-    def synthesize_response(self, state: DiagnosticState) -> dict:
+    async def synthesize_response(self, state: DiagnosticState, deterministic: bool = False) -> dict:
         """
         Analyzes all executed steps and their results to create a final, comprehensive
-        diagnostic answer for the user.
+        diagnostic answer for the user. By default it runs at SYNTHESIS_TEMPERATURE;
+        deterministic=True runs at temperature 0 and caches the answer.
         """
         print(f"🧬 {self.name}: Analyzing all steps and creating final answer...")
 
         user_question = state["input"]
 
+        cache_text = orjson.dumps([user_question, state["past_steps"]]).decode() if deterministic else None
+        if cache_text:
+            cached_response = self.response_cache.get("synthesis", cache_text)
+            if cached_response is not None:
+                print(f"✅ {self.name}: Reusing cached analysis for identical findings.")
+                return {"response": cached_response}
+
         # Collect all step results
         step_analysis = []
         for step, result in state["past_steps"]:
-            tool = step.split(":")[0] if ":" in step else "UNKNOWN"
-            description = step.split(":", 1)[1].strip() if ":" in step else step
+            tool, description = split_step(step)
+            tool = tool if tool is not None else "UNKNOWN"
             step_analysis.append(f"[{tool}] {description}\nResult: {result}")
 
         analysis_context = "\n\n".join(step_analysis)
 
-        synthesis_prompt = f"""You are an expert industrial diagnostics analyst. Analyze all the gathered information and provide a comprehensive diagnostic answer.
-
-User Question: {user_question}
+        # Per-query part of the synthesis prompt; the static analyst role and answer format
+        # live in SYNTHESIZER_SYSTEM_PROMPT so they form a cacheable prefix
+        synthesis_prompt = f"""User Question: {user_question}
 
 All Executed Steps and Results:
-{analysis_context}
-
-Create a comprehensive diagnostic response that:
-1. Directly answers the user's question.
-2. Synthesizes insights from all gathered data.
-3. Provides actionable recommendations.
-4. Uses clear, professional language.
-
-Format:
-🔧 COMPREHENSIVE DIAGNOSTIC ANALYSIS
-Question: {user_question}
-
-📊 Data Analysis: [Key findings from SCADA data]
-📘 Procedural Guidance: [Relevant steps from manuals]
-💡 Recommendations: [Specific actions to take]
-⚠️ Priority: [Most critical actions first]
-
-Keep it thorough but concise (300-400 words)."""
+{analysis_context}"""
 
         try:
-            # Direct call to Groq for unstructured text generation
-            response = requests.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self.groq_api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
+            # Stream the answer from Groq to the real console as it is written. It bypasses the API
+            # server's stdout capture: the frontend gets the answer once, from the final answer block
+            parts = []
+            async for delta in stream_groq_chat(
+                {
                     "model": "llama3-8b-8192", # Using llama3-8b-8192 as a good default
                     "messages": [
-                        {"role": "system", "content": "You are an expert industrial diagnostics analyst. Create comprehensive, actionable diagnostic responses."},
+                        {"role": "system", "content": SYNTHESIZER_SYSTEM_PROMPT},
                         {"role": "user", "content": synthesis_prompt}
                     ],
-                    "temperature": 0.3,
+                    "temperature": 0 if deterministic else SYNTHESIS_TEMPERATURE,
                     "max_tokens": 600
-                }
-            )
-
-            if response.status_code == 200:
-                final_response = response.json()["choices"][0]["message"]["content"]
-                print(f"✅ {self.name}: Created comprehensive diagnostic analysis.")
-            else:
-                print(f"❌ {self.name}: Groq API error during synthesis: {response.status_code} - {response.text}")
-                final_response = f"🔧 DIAGNOSTIC SUMMARY\nQuestion: {user_question}\n\nBased on {len(state['past_steps'])} completed diagnostic steps, the system has gathered relevant information. Please review the detailed results above for specific findings and recommendations. An error occurred during final synthesis."
+                },
+                api_key=self.groq_api_key
+            ):
+                parts.append(delta)
+                sys.__stdout__.write(delta)
+                sys.__stdout__.flush()
+            sys.__stdout__.write("\n")
+
+            final_response = "".join(parts)
+            print(f"✅ {self.name}: Created comprehensive diagnostic analysis.")
+            if cache_text:
+                self.response_cache.set("synthesis", cache_text, final_response)
+
+        except httpx.HTTPStatusError as e:
+            print(f"❌ {self.name}: {e} during synthesis")
+            final_response = f"🔧 DIAGNOSTIC SUMMARY\nQuestion: {user_question}\n\nBased on {len(state['past_steps'])} completed diagnostic steps, the system has gathered relevant information. Please review the detailed results above for specific findings and recommendations. An error occurred during final synthesis."
 
         except Exception as e:
             print(f"❌ {self.name}: Synthesis error: {e}")
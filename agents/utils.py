@@ -1,13 +1,37 @@
 # agents/utils.py
 import os
+import sys
 import json
+import logging
+import asyncio
+import time
+import re
+import hashlib
+import functools
+import threading
+import numpy as np
+import httpx
+import diskcache
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import OrderedDict
 from pydantic import BaseModel, Field
 from typing import Union
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
+
+# Agent tracing goes through this logger; DEBUG detail is dropped unless SENTIENTGRID_LOG_LEVEL=DEBUG.
+# The console handler writes to the real stdout, the API server attaches its own handler for the UI.
+logger = logging.getLogger("sentientgrid")
+logger.setLevel(os.getenv("SENTIENTGRID_LOG_LEVEL", "INFO").upper())
+logger.propagate = False
+_console_handler = logging.StreamHandler(sys.__stdout__)
+_console_handler.setFormatter(logging.Formatter("%(message)s"))
+logger.addHandler(_console_handler)
 GROQ_API_KEY = os.getenv("GROQ_API_KEY") # Changed back to GROQ_API_KEY for Groq
 
 if not GROQ_API_KEY:
@@ -35,33 +59,332 @@ class Act(BaseModel):
         "If you need to further use tools to get the answer, use Plan."
     )
 
+# =============================================================================
+# PLAN STEP PARSING
+# =============================================================================
+
+# Steps the tools can execute: "SCADA: ..." or "MANUAL: ..."
+STEP_PREFIX_RE = re.compile(r"^(SCADA|MANUAL):\s*(.*)", re.DOTALL)
+_STEP_LABEL_RE = re.compile(r"^([^:]*):\s*(.*)", re.DOTALL)
+
+_WORD_RE = re.compile(r"[a-z]+")
+
+def step_words(step: str) -> list:
+    """Lower-case word tokens of a plan step, for keyword set lookups"""
+    return _WORD_RE.findall(step.lower())
+
+def split_step(step: str) -> tuple:
+    """Split "LABEL: description" into (label, description); label is None when there is no colon"""
+    match = _STEP_LABEL_RE.match(step)
+    return (match.group(1), match.group(2).strip()) if match else (None, step)
+
 # =============================================================================
 # GROQ API HELPER
 # =============================================================================
 
-def call_groq_structured(prompt: str, model_class: BaseModel, model_name: str = "llama3-8b-8192"):
-    """Call Groq API and return structured output"""
+GROQ_CHAT_URL = "https://api.groq.com/openai/v1/chat/completions"
+STRUCTURED_SYSTEM_PROMPT = "You are a helpful assistant. Respond with valid JSON only."
+STRUCTURED_TEMPERATURE = 0  # Deterministic output is what makes responses cacheable
+
+# Validators and JSON schemas are built once per model instead of on every call
+_VALIDATORS = {model: model.model_validate for model in (Plan, Act, Response)}
+_SCHEMAS = {model: json.dumps(model.model_json_schema(), separators=(",", ":")) for model in (Plan, Act, Response)}
+_SYSTEM_PROMPTS = {
+    model: f"{STRUCTURED_SYSTEM_PROMPT}\nThe JSON must match this schema: {schema}"
+    for model, schema in _SCHEMAS.items()
+}
+# Forced tool call per model: Groq constrains the call arguments to the model's JSON schema
+# server-side, so the arguments parse and validate without prose wrappers or repair
+_TOOLS = {
+    model: {
+        "type": "function",
+        "function": {
+            "name": f"submit_{model.__name__.lower()}",
+            "description": f"Return the {model.__name__} result",
+            "parameters": model.model_json_schema()
+        }
+    }
+    for model in (Plan, Act, Response)
+}
+_TOOL_CHOICES = {model: {"type": "function", "function": {"name": tool["function"]["name"]}} for model, tool in _TOOLS.items()}
+# Output budgets per model: plans are a short list of steps, Act may carry a written response
+_MAX_TOKENS = {Plan: 200, Act: 400, Response: 500}
+
+# Constant parts of every structured request, built once at import
+_STRUCTURED_HEADERS = {
+    "Authorization": f"Bearer {GROQ_API_KEY}",
+    "Content-Type": "application/json"
+}
+
+@functools.lru_cache(maxsize=None)
+def _system_message(model_class: BaseModel, instructions: str = "") -> dict:
+    """System message for a structured call: JSON rules and schema, then the caller's static instructions"""
+    content = _SYSTEM_PROMPTS[model_class]
+    if instructions:
+        content = f"{content}\n\n{instructions}"
+    return {"role": "system", "content": content}
+
+_BASE_PAYLOAD = {"temperature": STRUCTURED_TEMPERATURE}
+# JSON mode: Groq only returns syntactically valid JSON objects (used if the tool call fails)
+_JSON_MODE = {"type": "json_object"}
+
+def _structured_payload(model_name: str, model_class: BaseModel, messages: list, use_tool: bool = True) -> dict:
+    """Request body for a structured call: a forced tool call, or plain JSON mode when use_tool is False"""
+    payload = {
+        **_BASE_PAYLOAD,
+        "model": model_name,
+        "messages": messages,
+        "max_tokens": _MAX_TOKENS[model_class]
+    }
+    if use_tool:
+        payload["tools"] = [_TOOLS[model_class]]
+        payload["tool_choice"] = _TOOL_CHOICES[model_class]
+    else:
+        payload["response_format"] = _JSON_MODE
+    return payload
+
+# Shared async client: keeps pooled keep-alive connections to Groq and does not
+# block the event loop while a request is in flight
+_HTTPX = httpx.AsyncClient(
+    http2=True,
+    timeout=30,
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+)
+
+# Shared session for the synchronous Groq calls (feedback analysis) so they reuse one
+# keep-alive HTTPS connection instead of a new TCP+TLS handshake each time; rate limits and
+# gateway errors are retried with backoff
+groq_session = requests.Session()
+groq_session.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 502, 503, 504], allowed_methods=frozenset({"POST"}), raise_on_status=False)
+))
+groq_session.headers.update({"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"})
+
+async def post_groq_chat(payload: dict, api_key: str = GROQ_API_KEY) -> httpx.Response:
+    """POST a chat completion payload to Groq on the shared async client"""
+    return await _HTTPX.post(
+        GROQ_CHAT_URL,
+        headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+        content=orjson.dumps(payload)
+    )
+
+async def stream_groq_chat(payload: dict, api_key: str = GROQ_API_KEY):
+    """Stream a chat completion from Groq on the shared async client, yielding content deltas as they arrive"""
+    async with _HTTPX.stream(
+        "POST",
+        GROQ_CHAT_URL,
+        headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+        content=orjson.dumps({**payload, "stream": True})
+    ) as response:
+        if response.status_code != 200:
+            await response.aread()
+            raise httpx.HTTPStatusError(
+                f"Groq API error: {response.status_code} - {response.text}", request=response.request, response=response
+            )
+        # Server-sent events: one "data: {chunk}" line per delta, ending with "data: [DONE]"
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            data = line[6:]
+            if data == "[DONE]":
+                break
+            delta = orjson.loads(data)["choices"][0]["delta"].get("content")
+            if delta:
+                yield delta
+
+async def close_groq_client():
+    """Close the shared Groq HTTP clients and the LLM cache (called on API server shutdown)"""
+    await _HTTPX.aclose()
+    groq_session.close()
+    _llm_cache.close()
+
+class LLMCache:
+    """
+    In-process LRU cache with a per-entry TTL for parsed structured LLM responses,
+    written through to an optional on-disk cache so entries survive server restarts.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 86400, disk_path: str = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._disk = diskcache.Cache(disk_path, size_limit=2**30) if disk_path else None
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, value) -> None:
+        self._entries[key] = (time.time() + self.ttl, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.time():
+            if entry is not None:
+                del self._entries[key]
+            # Fall through to disk (diskcache drops expired entries itself)
+            value = self._disk.get(key) if self._disk is not None else None
+            if value is None:
+                self.misses += 1
+                return None
+            self._remember(key, value)
+            self.hits += 1
+            return value
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: str, value) -> None:
+        self._remember(key, value)
+        if self._disk is not None:
+            self._disk.set(key, value, expire=self.ttl)
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
+
+class ResponseCache:
+    """
+    TTL cache for tool and synthesis results. Lookups try the exact text first; namespaces listed
+    in `semantic_namespaces` then fall back to the most similar earlier text whose embedding
+    cosine similarity is at least `threshold` (embeddings must be normalized).
+    Thread-safe, since tool steps run in worker threads.
+    """
+
+    def __init__(self, embed=None, semantic_namespaces=(), threshold: float = 0.95, maxsize: int = 256, ttl: float = 900):
+        self.embed = embed  # text -> list[float]; None disables the semantic layer
+        self.semantic_namespaces = set(semantic_namespaces)
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()  # (namespace, text) -> (expires, vector, value)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "semantic_hits": 0, "misses": 0}
+
+    def _use_semantic(self, namespace: str) -> bool:
+        return self.embed is not None and namespace in self.semantic_namespaces
+
+    def get(self, namespace: str, text: str):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get((namespace, text))
+            if entry is not None and entry[0] >= now:
+                self._entries.move_to_end((namespace, text))
+                self.stats["hits"] += 1
+                return entry[2]
+        if not self._use_semantic(namespace):
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        query_vector = np.asarray(self.embed(text))
+        with self._lock:
+            best_value, best_score = None, self.threshold
+            for (entry_namespace, _), (expires, vector, value) in self._entries.items():
+                if entry_namespace != namespace or vector is None or expires < now:
+                    continue
+                score = float(np.dot(query_vector, vector))
+                if score >= best_score:
+                    best_value, best_score = value, score
+            self.stats["semantic_hits" if best_value is not None else "misses"] += 1
+            return best_value
+
+    def set(self, namespace: str, text: str, value) -> None:
+        vector = np.asarray(self.embed(text)) if self._use_semantic(namespace) else None
+        with self._lock:
+            self._entries[(namespace, text)] = (time.time() + self.ttl, vector, value)
+            self._entries.move_to_end((namespace, text))
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+LLM_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "llm_cache")
+_llm_cache = LLMCache(disk_path=LLM_CACHE_DIR)
+
+# Single-flight map: identical structured calls already in flight share one Groq request
+_inflight: dict = {}
+
+# Provider-side prompt cache usage reported by Groq (cached prompt-prefix tokens vs. all prompt tokens)
+prompt_cache_stats = {"prompt_tokens": 0, "cached_tokens": 0}
+
+def _record_prompt_usage(body: dict) -> None:
+    usage = body.get("usage") or {}
+    cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+    prompt_cache_stats["prompt_tokens"] += usage.get("prompt_tokens", 0)
+    prompt_cache_stats["cached_tokens"] += cached_tokens or 0
+    if prompt_cache_stats["prompt_tokens"]:
+        hit_rate = prompt_cache_stats["cached_tokens"] / prompt_cache_stats["prompt_tokens"]
+        logger.debug(f"🗄️ Groq prompt cache: {cached_tokens} cached tokens this call, {hit_rate:.0%} overall")
+
+def _cache_key(model_name: str, prompt: str, model_class: BaseModel, instructions: str = "") -> str:
+    """Exact-match key for a structured call: model, system prompt, user prompt and output model"""
+    key_source = orjson.dumps(
+        {"m": model_name, "s": _system_message(model_class, instructions)["content"], "p": prompt, "c": model_class.__name__},
+        option=orjson.OPT_SORT_KEYS
+    )
+    return hashlib.sha256(key_source).hexdigest()
+
+def _validate_output(model_class: BaseModel, data: dict):
+    """Validate parsed JSON into model_class; Act is unwrapped to its inner Response or Plan"""
+    if model_class == Act:
+        return _VALIDATORS[Act](data).action
+    return _VALIDATORS[model_class](data)
+
+def _fallback_output(model_class: BaseModel):
+    """Provide a default fallback based on the model_class expected"""
+    if model_class == Act:
+        # For Act, return a Plan by default
+        return Plan(steps=["SCADA: Get system information"])
+    elif model_class == Plan:
+        return Plan(steps=["SCADA: Get system information"])
+    else:
+        return Response(response="I encountered an error processing your request.")
+
+async def call_groq_structured(prompt: str, model_class: BaseModel, model_name: str = "llama3-8b-8192", instructions: str = ""):
+    """
+    Call Groq API and return structured output.
+    `instructions` is static text sent in the system message (cacheable prefix); `prompt` is the per-call user message.
+    """
+    # Structured calls run at temperature 0, so identical requests can reuse earlier answers
+    cache_key = _cache_key(model_name, prompt, model_class, instructions) if STRUCTURED_TEMPERATURE == 0 else None
+    if cache_key:
+        cached_data = _llm_cache.get(cache_key)
+        if cached_data is not None:
+            return _validate_output(model_class, cached_data)
+
+        # Same request already in flight: wait for its answer instead of calling Groq again
+        inflight = _inflight.get(cache_key)
+        if inflight is not None:
+            shared_data = await inflight
+            return _validate_output(model_class, shared_data) if shared_data is not None else _fallback_output(model_class)
+
+    future = None
+    if cache_key:
+        future = asyncio.get_running_loop().create_future()
+        _inflight[cache_key] = future
+    shared_data = None
+
     try:
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {GROQ_API_KEY}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": model_name, # Use the model_name parameter
-                "messages": [
-                    {"role": "system", "content": f"You are a helpful assistant. Respond with valid JSON only."},
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": 0,
-                "max_tokens": 500
-            }
-        )
+        messages = [_system_message(model_class, instructions), {"role": "user", "content": prompt}]
+        payload = _structured_payload(model_name, model_class, messages)
+        response = await _HTTPX.post(GROQ_CHAT_URL, headers=_STRUCTURED_HEADERS, content=orjson.dumps(payload))
+
+        if response.status_code == 400 and b"tool_use_failed" in response.content:
+            # The model couldn't produce a valid tool call; ask once more in plain JSON mode
+            logger.warning(f"⚠️ Groq tool call failed for {model_class.__name__}, retrying in JSON mode")
+            payload = _structured_payload(model_name, model_class, messages, use_tool=False)
+            response = await _HTTPX.post(GROQ_CHAT_URL, headers=_STRUCTURED_HEADERS, content=orjson.dumps(payload))
 
         if response.status_code == 200:
-            content = response.json()["choices"][0]["message"]["content"]
-            data = json.loads(content)
+            body = orjson.loads(response.content)
+            _record_prompt_usage(body)
+            message = body["choices"][0]["message"]
+            tool_calls = message.get("tool_calls")
+            content = tool_calls[0]["function"]["arguments"] if tool_calls else message["content"]
+            data = orjson.loads(content)
+            used_fallback = False
 
             # Handle different response formats and fix common issues
             if model_class == Plan:
@@ -76,8 +399,9 @@ def call_groq_structured(prompt: str, model_class: BaseModel, model_name: str =
                         data = {"steps": data["actions"]}
                     else:
                         # If no steps found, create a default plan
-                        print(f"⚠️ Groq API returned unexpected format: {data}")
+                        logger.warning(f"⚠️ Groq API returned unexpected format: {data}")
                         data = {"steps": ["SCADA: Get system information"]}
+                        used_fallback = True
                 
                 # Ensure steps are strings, not objects
                 if "steps" in data and isinstance(data["steps"], list):
@@ -101,25 +425,23 @@ def call_groq_structured(prompt: str, model_class: BaseModel, model_name: str =
                     data["steps"] = processed_steps
 
             # Handle Act model specially - extract the inner action
-            if model_class == Act:
-                act = model_class.model_validate(data)
-                return act.action  # Return the inner Response or Plan
-            else:
-                return model_class.model_validate(data)
+            result = _validate_output(model_class, data)
+            # Don't cache or share the stand-in plan; waiters fall back on their own
+            if not used_fallback:
+                shared_data = data
+                if cache_key:
+                    _llm_cache.set(cache_key, data)
+            return result
         else:
 
             raise Exception(f"API error: {response.status_code}")
     except Exception as e:
-        print(f"❌ Groq API call failed. Error: {str(e)}")
-        print(f"❌ Exception type: {type(e).__name__}")
-        import traceback
-        traceback.print_exc()
+        logger.error(f"❌ Groq API call failed. Error: {str(e)}")
+        logger.error(f"❌ Exception type: {type(e).__name__}", exc_info=True)
         
-        # Provide a default fallback based on the model_class expected
-        if model_class == Act:
-            # For Act, return a Plan by default
-            return Plan(steps=["SCADA: Get system information"])
-        elif model_class == Plan:
-            return Plan(steps=["SCADA: Get system information"])
-        else:
-            return Response(response="I encountered an error processing your request.")
\ No newline at end of file
+        return _fallback_output(model_class)
+    finally:
+        # Release waiters (None tells them the call failed and they should fall back too)
+        if future is not None:
+            _inflight.pop(cache_key, None)
+            future.set_result(shared_data)
\ No newline at end of file
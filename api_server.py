@@ -1,19 +1,52 @@
 # api_server.py (COMPLETE FIXED VERSION)
 from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import asyncio
+import logging
 import os
+import re
 import sys
+import time
+import threading
+from collections import deque, defaultdict
 from datetime import datetime
 import traceback
+import uuid
 
 # Add parent directory to path
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
-app = FastAPI(title="SentientGrid API", version="1.0.0")
+# In-process human decision slot shared with the orchestrator
+import shared_decision
+
+app = FastAPI(title="SentientGrid API", version="1.0.0", default_response_class=ORJSONResponse)
+
+# Pure ASGI middleware (no BaseHTTPMiddleware) so the polled endpoints stay cheap
+class ProcessTimeMiddleware:
+    """Adds an X-Process-Time header with the request handling time in milliseconds"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start_time = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed_ms = (time.perf_counter() - start_time) * 1000
+                message.setdefault("headers", []).append((b"x-process-time", f"{elapsed_ms:.2f}".encode()))
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
+
+app.add_middleware(ProcessTimeMiddleware)
 
 # Enable CORS
 app.add_middleware(
@@ -24,6 +57,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large JSON payloads (terminal output, history) for the polling frontend
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=5)
+
+# Maximum number of captured terminal lines kept in memory
+TERMINAL_OUTPUT_MAXLEN = 5000
+
 # Global state management
 class SystemState:
     def __init__(self):
@@ -31,17 +70,39 @@ class SystemState:
         self.orchestrator = None
         self.is_processing = False
         self.current_query = None
-        self.terminal_output = []
+        # Every captured line gets an increasing seq so clients can poll for deltas;
+        # the lock keeps seq order and append order identical across worker threads
+        self.output_lock = threading.Lock()
+        self.last_seq = 0
+        # seq restarts with the process; a cursor from another epoch (server restart) is stale
+        self.output_epoch = uuid.uuid4().hex
+        self.reset_terminal_output()
         self.current_iteration = 0
-        self.awaiting_human_input = False
         self.human_decision_response = None
-        self.human_input_event = None
         self.workflow_history = []
 
+    @property
+    def awaiting_human_input(self) -> bool:
+        """Whether the orchestrator is paused for a human decision"""
+        return shared_decision.is_awaiting_input()
+
+    @awaiting_human_input.setter
+    def awaiting_human_input(self, awaiting: bool):
+        shared_decision.set_awaiting_input(awaiting)
+
     def set_awaiting_human_input(self, awaiting: bool):
         """Set the awaiting human input flag"""
         self.awaiting_human_input = awaiting
 
+    def reset_terminal_output(self):
+        """Clear captured terminal output and its per-iteration grouping"""
+        with self.output_lock:
+            self.terminal_output = deque(maxlen=TERMINAL_OUTPUT_MAXLEN)
+            # Entries grouped by iteration as they arrive (iteration 0 is general output)
+            self.iterations = defaultdict(lambda: deque(maxlen=TERMINAL_OUTPUT_MAXLEN))
+            # Clients holding a cursor older than this must drop their cached lines
+            self.start_seq = self.last_seq
+
         
 system_state = SystemState()
 
@@ -56,7 +117,54 @@ class HumanDecision(BaseModel):
 class AwaitingHumanInput(BaseModel):
     awaiting: bool
 
+class BatchQueryItem(BaseModel):
+    id: str
+    query: str
+
+class BatchQueryRequest(BaseModel):
+    requests: List[BatchQueryItem]
+
+# Message types in priority order, matched case-insensitively (no per-line .upper() copy)
+_MESSAGE_TYPE_PATTERNS = [
+    ("error", re.compile(r"❌|ERROR", re.IGNORECASE)),
+    ("success", re.compile(r"✅|SUCCESS", re.IGNORECASE)),
+    ("warning", re.compile(r"⚠️|WARNING", re.IGNORECASE)),
+    ("human_input", re.compile(r"HUMAN IN THE LOOP")),
+    ("agent", re.compile(r"🧠|🔧|📊|🤔")),
+]
+
+# Iteration marker printed by the orchestrator's execution loop
+_ITER_RE = re.compile(r"Execution Loop Iteration\s+(\d+)")
+
 # Custom print capture for terminal output
+def get_message_type(text):
+    for message_type, pattern in _MESSAGE_TYPE_PATTERNS:
+        if pattern.search(text):
+            return message_type
+    return "info"
+
+def capture_terminal_line(text, message_type=None):
+    """Record one line of output for the frontend"""
+    # Extract iteration number if present
+    iteration = system_state.current_iteration
+    iteration_match = _ITER_RE.search(text)
+    if iteration_match:
+        iteration = int(iteration_match.group(1))
+        system_state.current_iteration = iteration
+    
+    # Add to terminal output and its iteration group
+    entry = {
+        "timestamp": datetime.now().isoformat(),
+        "type": message_type or get_message_type(text),
+        "message": text.strip(),
+        "iteration": iteration
+    }
+    with system_state.output_lock:
+        system_state.last_seq += 1
+        entry["seq"] = system_state.last_seq
+        system_state.terminal_output.append(entry)
+        system_state.iterations[iteration].append(entry)
+
 class TerminalCapture:
     def __init__(self):
         self.original_stdout = sys.stdout
@@ -64,22 +172,7 @@ class TerminalCapture:
     
     def write(self, text):
         if text.strip():
-            # Extract iteration number if present
-            iteration = system_state.current_iteration
-            if "Execution Loop Iteration" in text:
-                try:
-                    iteration = int(text.split("Execution Loop Iteration")[1].strip().split()[0])
-                    system_state.current_iteration = iteration
-                except:
-                    pass
-            
-            # Add to terminal output
-            system_state.terminal_output.append({
-                "timestamp": datetime.now().isoformat(),
-                "type": self._get_message_type(text),
-                "message": text.strip(),
-                "iteration": iteration
-            })
+            capture_terminal_line(text)
         
         # Still write to original stdout
         self.original_stdout.write(text)
@@ -87,20 +180,17 @@ class TerminalCapture:
     
     def flush(self):
         self.original_stdout.flush()
-    
-    def _get_message_type(self, text):
-        if "❌" in text or "ERROR" in text.upper():
-            return "error"
-        elif "✅" in text or "SUCCESS" in text.upper():
-            return "success"
-        elif "⚠️" in text or "WARNING" in text.upper():
-            return "warning"
-        elif "HUMAN IN THE LOOP" in text:
-            return "human_input"
-        elif "🧠" in text or "🔧" in text or "📊" in text or "🤔" in text:
-            return "agent"
-        else:
-            return "info"
+
+# Error and warning records are typed by level; only INFO records need pattern classification
+_LEVEL_MESSAGE_TYPES = {logging.ERROR: "error", logging.CRITICAL: "error", logging.WARNING: "warning"}
+
+class TerminalLogHandler(logging.Handler):
+    """Feeds "sentientgrid" log records to the frontend without going through stdout capture"""
+    def emit(self, record):
+        try:
+            capture_terminal_line(record.getMessage(), _LEVEL_MESSAGE_TYPES.get(record.levelno))
+        except Exception:
+            self.handleError(record)
 
 # Initialize system on startup
 @app.on_event("startup")
@@ -111,9 +201,19 @@ async def startup_event():
     # Redirect stdout to capture print statements
     sys.stdout = TerminalCapture()
     
+    # Agent log records reach the frontend directly (level set by SENTIENTGRID_LOG_LEVEL)
+    logging.getLogger("sentientgrid").addHandler(TerminalLogHandler())
+    
     # Start initialization in background task
     asyncio.create_task(initialize_system_components())
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release pooled Groq connections"""
+    if system_state.orchestrator:
+        from agents.utils import close_groq_client
+        await close_groq_client()
+
 async def initialize_system_components():
     """Initialize system components in background"""
     try:
@@ -122,32 +222,46 @@ async def initialize_system_components():
         # Import here to avoid circular imports
         from agents.orchestrator import Orchestrator
         from scada.generate_scada_db import generate_database
-        from manual.create_vector_store import VectorStoreManager
+        from manual.create_vector_store import VectorStoreManager, warm_up_vector_store
         
         # Ensure data is ready
         base_dir = os.path.dirname(os.path.abspath(__file__))
         
-        # Check SCADA database
-        db_path = os.path.join(base_dir, "data", "scada_data.db")
-        if not os.path.exists(db_path):
-            print("Generating SCADA database...")
-            generate_database()
-            print("✅ SCADA database ready")
-        else:
-            print("✅ SCADA database already exists")
+        def ensure_scada_database():
+            # Check SCADA database
+            db_path = os.path.join(base_dir, "data", "scada_data.db")
+            if not os.path.exists(db_path):
+                print("Generating SCADA database...")
+                generate_database()
+                print("✅ SCADA database ready")
+            else:
+                print("✅ SCADA database already exists")
+        
+        def ensure_vector_store():
+            # Check vector store
+            vector_store_path = os.path.join(base_dir, "data", "vector_store")
+            if not os.path.exists(vector_store_path) or not os.listdir(vector_store_path):
+                print("Creating vector store from PDF manuals...")
+                manager = VectorStoreManager()
+                manager.run_full_pipeline()
+                print("✅ Vector store ready")
+            else:
+                print("✅ Vector store already exists")
+            # Load the embeddings model and HNSW index now rather than on the first query
+            try:
+                warm_up_vector_store(vector_store_path)
+                print("✅ Embeddings model and vector index warmed up")
+            except Exception as e:
+                print(f"⚠️ Vector store warm-up skipped: {e}")
         
-        # Check vector store
-        vector_store_path = os.path.join(base_dir, "data", "vector_store")
-        if not os.path.exists(vector_store_path) or not os.listdir(vector_store_path):
-            print("Creating vector store from PDF manuals...")
-            manager = VectorStoreManager()
-            manager.run_full_pipeline()
-            print("✅ Vector store ready")
-        else:
-            print("✅ Vector store already exists")
+        # The two data sets are independent, so build them side by side in worker threads
+        await asyncio.gather(
+            asyncio.to_thread(ensure_scada_database),
+            asyncio.to_thread(ensure_vector_store)
+        )
         
-        # Initialize orchestrator
-        system_state.orchestrator = Orchestrator()
+        # Initialize orchestrator (agent construction is blocking, keep it off the event loop)
+        system_state.orchestrator = await asyncio.to_thread(Orchestrator)
         system_state.initialization_complete = True
         print("✅ API Server components ready!")
         
@@ -205,16 +319,6 @@ async def submit_query(request: QueryRequest, x_groq_api_key: Optional[str] = He
     if not system_state.orchestrator:
         raise HTTPException(status_code=500, detail="System not initialized. Please restart the server.")
     
-    # Clear previous state
-    system_state.terminal_output = []
-    system_state.current_iteration = 0
-    system_state.awaiting_human_input = False
-    system_state.human_decision_response = None
-    
-    # Clear shared decision
-    import shared_decision
-    shared_decision.clear_decision()
-    
     # Start processing in background
     asyncio.create_task(process_query(request.query))
     
@@ -224,8 +328,52 @@ async def submit_query(request: QueryRequest, x_groq_api_key: Optional[str] = He
         "message": "Query submitted successfully"
     }
 
-async def process_query(query: str):
-    """Process the diagnostic query"""
+@app.post("/api/query/batch")
+async def submit_query_batch(request: BatchQueryRequest, x_groq_api_key: Optional[str] = Header(None)):
+    """Submit several diagnostic queries in one round trip"""
+    if x_groq_api_key:
+        set_groq_api_key(x_groq_api_key)
+    
+    if system_state.is_processing:
+        raise HTTPException(status_code=400, detail="System is already processing a query")
+    
+    if not system_state.orchestrator:
+        raise HTTPException(status_code=500, detail="System not initialized. Please restart the server.")
+    
+    if not request.requests:
+        raise HTTPException(status_code=400, detail="Batch contains no queries")
+    
+    # Mark busy now so no other query slips in between items (process_query_batch clears it at the end)
+    system_state.is_processing = True
+    asyncio.create_task(process_query_batch(request.requests))
+    
+    return {
+        "status": "processing",
+        "ids": [item.id for item in request.requests],
+        "message": f"{len(request.requests)} queries submitted successfully"
+    }
+
+async def process_query_batch(items: List[BatchQueryItem]):
+    """Process batched queries one after another"""
+    # Queries share the orchestrator's conversation history and the human-in-the-loop
+    # decision, so they run in order; results land in workflow_history tagged with their id.
+    # Only the last item clears the processing state, so the batch stays busy end to end
+    for index, item in enumerate(items):
+        await process_query(item.query, request_id=item.id, finish=index == len(items) - 1)
+
+def reset_query_state():
+    """Clear per-query output and any pending human decision"""
+    system_state.reset_terminal_output()
+    system_state.current_iteration = 0
+    system_state.awaiting_human_input = False
+    system_state.human_decision_response = None
+    
+    shared_decision.clear_decision()
+
+async def process_query(query: str, request_id: Optional[str] = None, finish: bool = True):
+    """Process the diagnostic query (`finish=False` keeps the system marked busy for the next batch item)"""
+    # Clear previous state
+    reset_query_state()
     system_state.is_processing = True
     system_state.current_query = query
     
@@ -241,20 +389,33 @@ async def process_query(query: str):
         print(result)
         print("="*60)
         
-        system_state.workflow_history.append({
+        history_entry = {
             "timestamp": datetime.now().isoformat(),
             "query": query,
             "result": result
-        })
+        }
+        if request_id:
+            history_entry["id"] = request_id
+        system_state.workflow_history.append(history_entry)
         
     except Exception as e:
         print(f"❌ Error during workflow execution: {e}")
         traceback.print_exc()
+        
+        # Batched queries record their failure so the remaining items still run
+        if request_id:
+            system_state.workflow_history.append({
+                "timestamp": datetime.now().isoformat(),
+                "id": request_id,
+                "query": query,
+                "error": str(e)
+            })
     
     finally:
-        system_state.is_processing = False
-        system_state.current_query = None
         system_state.awaiting_human_input = False
+        if finish:
+            system_state.is_processing = False
+            system_state.current_query = None
 
 @app.post("/api/human-decision")
 async def submit_human_decision(decision: HumanDecision, x_groq_api_key: Optional[str] = Header(None)):
@@ -263,8 +424,7 @@ async def submit_human_decision(decision: HumanDecision, x_groq_api_key: Optiona
     if x_groq_api_key:
         set_groq_api_key(x_groq_api_key)
 
-    # Store in shared decision file with feedback support
-    import shared_decision
+    # Store in the shared decision slot with feedback support (wakes the waiting orchestrator)
     shared_decision.set_decision(decision.choice, decision.feedback)
 
     # Also store in system state (backup)
@@ -286,20 +446,12 @@ async def submit_human_decision(decision: HumanDecision, x_groq_api_key: Optiona
 @app.get("/api/human-decision-response")
 async def get_human_decision_response():
     """Get the stored human decision response"""
-    import shared_decision
-    decision = shared_decision.get_decision()
-    if decision:
-        return {
-            "decision": decision.get("choice") if isinstance(decision, dict) else decision,
-            "feedback": decision.get("feedback") if isinstance(decision, dict) else None
-        }
-    else:
-        return {"decision": None, "feedback": None}
+    state = shared_decision.snapshot()
+    return {"decision": state["choice"], "feedback": state["feedback"]}
 
 @app.delete("/api/human-decision-response")
 async def clear_human_decision_response():
     """Clear the stored human decision response"""
-    import shared_decision
     shared_decision.clear_decision()
     system_state.human_decision_response = None
     return {"status": "cleared"}
@@ -310,27 +462,48 @@ async def set_awaiting_human_input(awaiting: AwaitingHumanInput):
     system_state.set_awaiting_human_input(awaiting.awaiting)
     return {"status": "updated", "awaiting_human_input": awaiting.awaiting}
 
+def entries_since(entries, since: int) -> list:
+    """Entries with seq > since, scanning back from the newest (O(new lines))"""
+    new_entries = []
+    for entry in reversed(entries):
+        if entry["seq"] <= since:
+            break
+        new_entries.append(entry)
+    new_entries.reverse()
+    return new_entries
+
 @app.get("/api/terminal-output")
-async def get_terminal_output():
-    """Get current terminal output organized by iterations"""
-    # Group by iterations
-    iterations = {}
-    general_output = []
-    
-    for entry in system_state.terminal_output:
-        iteration = entry.get('iteration', 0)
-        if iteration > 0:
-            if iteration not in iterations:
-                iterations[iteration] = []
-            iterations[iteration].append(entry)
-        else:
-            general_output.append(entry)
-    
+async def get_terminal_output(since: Optional[int] = None, epoch: Optional[str] = None):
+    """Get current terminal output organized by iterations (only lines after `since` if given with the current `epoch`)"""
+    # Entries are already grouped by TerminalCapture as they are written
+    with system_state.output_lock:
+        grouped = dict(system_state.iterations)
+        terminal_output = system_state.terminal_output
+        next_seq = system_state.last_seq
+        start_seq = system_state.start_seq
+
+        # Full snapshot on the first poll, when the output was cleared after the client's cursor,
+        # or when the cursor comes from an earlier server process
+        is_delta = (
+            since is not None
+            and epoch == system_state.output_epoch
+            and start_seq <= since <= next_seq
+        )
+        select = (lambda entries: entries_since(entries, since)) if is_delta else list
+
+        all_output = select(terminal_output)
+        general_output = select(grouped.get(0, ()))
+        iterations = {iteration: select(entries) for iteration, entries in grouped.items() if iteration > 0}
+
     return {
-        "terminal_output": system_state.terminal_output,
+        "terminal_output": all_output,
         "general_output": general_output,
-        "iterations": iterations,
-        "current_iteration": system_state.current_iteration
+        "iterations": {iteration: entries for iteration, entries in iterations.items() if entries},
+        "current_iteration": system_state.current_iteration,
+        "next_seq": next_seq,
+        "start_seq": start_seq,
+        "epoch": system_state.output_epoch,
+        "is_delta": is_delta
     }
 
 @app.get("/api/history")
@@ -342,7 +515,7 @@ async def get_history():
 async def clear_history():
     """Clear workflow history"""
     system_state.workflow_history = []
-    system_state.terminal_output = []
+    system_state.reset_terminal_output()
     return {"status": "history_cleared"}
 
 # Session management endpoints
@@ -364,6 +537,16 @@ async def clear_conversation_history():
     system_state.orchestrator.clear_conversation_history()
     return {"message": "Conversation history cleared successfully"}
 
+@app.get("/api/state")
+async def get_state(since: Optional[int] = None, epoch: Optional[str] = None):
+    """Status, terminal output and conversation history in one response (one round trip per UI refresh)"""
+    return {
+        "status": await get_status(),
+        "terminal": await get_terminal_output(since, epoch),
+        # History is empty until the orchestrator has finished initializing
+        "conversation_history": system_state.orchestrator.get_conversation_history() if system_state.orchestrator else []
+    }
+
 if __name__ == "__main__":
     import uvicorn
     print("🚀 Starting SentientGrid API Server...")
@@ -373,7 +556,9 @@ if __name__ == "__main__":
     print("   - GET  /health                     - Health check")
     print("   - GET  /api/status                 - System status")
     print("   - POST /api/query                  - Submit diagnostic query")
+    print("   - POST /api/query/batch            - Submit several queries")
     print("   - GET  /api/terminal-output        - Get terminal output")
+    print("   - GET  /api/state                  - Status, terminal output and history")
     print("   - POST /api/human-decision         - Submit human decision")
     print("   - GET  /api/human-decision-response - Get human decision")
     print("   - DELETE /api/human-decision-response - Clear human decision")
@@ -382,7 +567,8 @@ if __name__ == "__main__":
     print("-" * 50)
     
     try:
-        uvicorn.run(app, host="0.0.0.0", port=8000, reload=False)
+        # uvloop + httptools are installed with uvicorn[standard]
+        uvicorn.run(app, host="0.0.0.0", port=8000, reload=False, loop="uvloop", http="httptools")
     except KeyboardInterrupt:
         print("\n🛑 Server stopped by user")
     except Exception as e:
@@ -1,6 +1,9 @@
 import os
 import shutil
-from typing import List
+import functools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Tuple
 from pathlib import Path
 import logging
 import json
@@ -10,12 +13,119 @@ from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
 from langchain.schema import Document
 
 # --- Logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# HNSW settings applied when a collection is created: cosine distance over the normalized
+# embeddings, and fixed graph degree / search breadth so query latency stays bounded as manuals grow
+HNSW_COLLECTION_METADATA = {"hnsw:space": "cosine", "hnsw:M": 32, "hnsw:search_ef": 64}
+
+# "onnx" runs MiniLM through Sentence Transformers' ONNX Runtime backend with int8-quantized
+# weights (published in the model repo); "torch" keeps the FP32 PyTorch model
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "onnx")
+ONNX_MODEL_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+class OnnxSTEmbeddings(Embeddings):
+    """LangChain embeddings on a Sentence Transformers model loaded with the ONNX backend."""
+    backend = "onnx"
+
+    def __init__(self, model_name: str, file_name: str = ONNX_MODEL_FILE, batch_size: int = 64):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, backend="onnx", model_kwargs={"file_name": file_name})
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.encode(
+            texts, batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True
+        ).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+@functools.lru_cache(maxsize=1)
+def get_embeddings(model_name: str = "all-MiniLM-L6-v2") -> Embeddings:
+    """Process-wide embeddings model, loaded once and shared by the pipeline and the search tool."""
+    if EMBEDDINGS_BACKEND == "onnx":
+        try:
+            embeddings = OnnxSTEmbeddings(model_name)
+            logger.info(f"Using ONNX int8 embeddings: {model_name}")
+            return embeddings
+        except Exception as e:
+            logger.warning(f"ONNX embeddings unavailable, falling back to PyTorch: {str(e)}")
+
+    import torch
+    # Cap intra-op threads so encoding doesn't oversubscribe the CPU alongside the API workers
+    torch.set_num_threads(min(4, os.cpu_count() or 1))
+    logger.info(f"Using HuggingFace embeddings: {model_name}")
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'batch_size': 64, 'normalize_embeddings': True}
+    )
+
+@functools.lru_cache(maxsize=4)
+def get_chroma(persist_dir: str, collection_name: str = "technical_manuals",
+               embedding_model: str = "all-MiniLM-L6-v2") -> Chroma:
+    """Process-wide Chroma handle per (directory, collection). Call get_chroma.cache_clear() after rebuilding the store."""
+    return Chroma(
+        persist_directory=persist_dir,
+        embedding_function=get_embeddings(embedding_model),
+        collection_name=collection_name
+    )
+
+def _extract_equipment_type(filename: str) -> str:
+    keywords = {
+        'kuka': 'Robot', 'fanuc': 'Robot', 'siemens': 'PLC',
+        'allen-bradley': 'VFD', 'powerflex': 'VFD',
+        'simatic': 'PLC', 'schneider': 'VFD', 'abb': 'Motor Control',
+        'mitsubishi': 'PLC'
+    }
+    name = filename.lower()
+    for key, val in keywords.items():
+        if key in name:
+            return val
+    return 'Industrial Equipment'
+
+def _load_one_pdf(pdf: Path) -> Tuple[str, List[Document]]:
+    """Loads one PDF with its page metadata. Top-level so it can run in a worker process."""
+    try:
+        pdf_docs = PyPDFLoader(str(pdf)).load()
+    except Exception as e:
+        logger.error(f"Failed to load {pdf.name}: {str(e)}")
+        return pdf.name, []
+    for i, doc in enumerate(pdf_docs):
+        doc.metadata.update({
+            'source_file': pdf.name,
+            'file_path': str(pdf),
+            'page_number': i + 1,
+            'total_pages': len(pdf_docs),
+            'equipment_type': _extract_equipment_type(pdf.name),
+            'processed_date': datetime.now().isoformat()
+        })
+    return pdf.name, pdf_docs
+
+def add_embedded_documents(vs: Chroma, ids: List[str], vectors: List[List[float]],
+                           texts: List[str], metadatas: List[dict]) -> None:
+    """Write precomputed vectors into a Chroma collection in batches of Chroma's maximum size."""
+    batch_size = vs._client.get_max_batch_size()
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        vs._collection.upsert(
+            ids=ids[start:end],
+            embeddings=vectors[start:end],
+            documents=texts[start:end],
+            metadatas=metadatas[start:end]
+        )
+
+def warm_up_vector_store(persist_dir: str, embedding_model: str = "all-MiniLM-L6-v2") -> None:
+    """Load the embeddings model, open the collection and run one query so the first real search starts warm."""
+    vs = get_chroma(persist_dir, "technical_manuals", embedding_model)
+    vs.similarity_search_by_vector(get_embeddings(embedding_model).embed_query("warm up"), k=1)
+
 class VectorStoreManager:
     """Manages the creation and maintenance of the vector store for technical manuals."""
     
@@ -42,18 +152,15 @@ class VectorStoreManager:
             separators=["\n\n", "\n", ". ", " ", ""]
         )
 
-        # Embeddings
-        logger.info(f"Using HuggingFace embeddings: {self.embedding_model}")
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=self.embedding_model,
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
+        # Embeddings (shared with the manual search tool)
+        self.embeddings = get_embeddings(self.embedding_model)
 
     def clean_existing_store(self) -> None:
         if self.vector_store_dir.exists():
             logger.info(f"Removing existing vector store at {self.vector_store_dir}")
             shutil.rmtree(self.vector_store_dir)
+        # Cached handles point at the old collection
+        get_chroma.cache_clear()
 
     def load_pdf_documents(self) -> List[Document]:
         logger.info(f"Loading PDFs from {self.pdf_source_dir}")
@@ -64,56 +171,61 @@ class VectorStoreManager:
             logger.warning("No PDF files found.")
             return []
 
-        for pdf in pdf_files:
+        # PDF parsing is CPU-bound and independent per file, so spread it over processes
+        cpu = os.cpu_count() or 1
+        workers = min(cpu, len(pdf_files))
+        chunksize = max(1, len(pdf_files) // (4 * cpu))
+        if workers == 1:
+            results = [_load_one_pdf(pdf) for pdf in pdf_files]
+        else:
             try:
-                loader = PyPDFLoader(str(pdf))
-                pdf_docs = loader.load()
-                for i, doc in enumerate(pdf_docs):
-                    doc.metadata.update({
-                        'source_file': pdf.name,
-                        'file_path': str(pdf),
-                        'page_number': i + 1,
-                        'total_pages': len(pdf_docs),
-                        'equipment_type': self._extract_equipment_type(pdf.name),
-                        'processed_date': datetime.now().isoformat()
-                    })
-                documents.extend(pdf_docs)
-            except Exception as e:
-                logger.error(f"Failed to load {pdf.name}: {str(e)}")
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(_load_one_pdf, pdf_files, chunksize=chunksize))
+            except (OSError, BrokenProcessPool) as e:
+                # e.g. no multiprocessing support in the sandbox; parsing still overlaps file I/O in threads
+                logger.warning(f"Process pool unavailable ({str(e)}), loading PDFs with threads")
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(_load_one_pdf, pdf_files))
+
+        for _, pdf_docs in results:
+            documents.extend(pdf_docs)
 
         logger.info(f"Loaded {len(documents)} documents")
         return documents
 
     def _extract_equipment_type(self, filename: str) -> str:
-        keywords = {
-            'kuka': 'Robot', 'fanuc': 'Robot', 'siemens': 'PLC',
-            'allen-bradley': 'VFD', 'powerflex': 'VFD',
-            'simatic': 'PLC', 'schneider': 'VFD', 'abb': 'Motor Control',
-            'mitsubishi': 'PLC'
-        }
-        name = filename.lower()
-        for key, val in keywords.items():
-            if key in name:
-                return val
-        return 'Industrial Equipment'
+        return _extract_equipment_type(filename)
 
     def create_chunks(self, docs: List[Document]) -> List[Document]:
-        chunks = self.text_splitter.split_documents(docs)
-        for i, chunk in enumerate(chunks):
-            chunk.metadata.update({
-                'chunk_id': f"chunk_{i:06d}",
-                'chunk_size': len(chunk.page_content),
-                'chunk_index': i
-            })
+        # Split page by page and build each chunk's metadata as it is created: one pass over
+        # the chunks, and a shallow copy of the page metadata instead of split_documents' deepcopy
+        chunks = []
+        for doc in docs:
+            for text in self.text_splitter.split_text(doc.page_content):
+                i = len(chunks)
+                metadata = doc.metadata.copy()
+                metadata['chunk_id'] = f"chunk_{i:06d}"
+                metadata['chunk_size'] = len(text)
+                metadata['chunk_index'] = i
+                chunks.append(Document(page_content=text, metadata=metadata))
         return chunks
 
     def create_vector_store(self, chunks: List[Document]) -> Chroma:
-        return Chroma.from_documents(
-            documents=chunks,
-            embedding=self.embeddings,
+        # Embed every chunk up front in large batches, then hand Chroma the vectors so it
+        # doesn't re-embed batch by batch
+        texts = [c.page_content for c in chunks]
+        logger.info(f"Embedding {len(texts)} chunks")
+        vectors = self.embeddings.embed_documents(texts)
+
+        vs = Chroma(
             persist_directory=str(self.vector_store_dir),
-            collection_name="technical_manuals"
+            embedding_function=self.embeddings,
+            collection_name="technical_manuals",
+            collection_metadata=HNSW_COLLECTION_METADATA
         )
+        ids = [c.metadata['chunk_id'] for c in chunks]
+        add_embedded_documents(vs, ids, vectors, texts, [c.metadata for c in chunks])
+        return vs
 
     def save_metadata(self, docs: List[Document], chunks: List[Document]) -> None:
         meta = {
@@ -130,11 +242,7 @@ class VectorStoreManager:
 
     def _verify_vector_store(self) -> None:
         try:
-            vs = Chroma(
-                persist_directory=str(self.vector_store_dir),
-                embedding_function=self.embeddings,
-                collection_name="technical_manuals"
-            )
+            vs = get_chroma(str(self.vector_store_dir), "technical_manuals", self.embedding_model)
             results = vs.similarity_search("troubleshooting high temperature error", k=3)
             for i, r in enumerate(results):
                 logger.info(f"Result {i+1}: {r.metadata.get('source_file', 'Unknown')} - Page {r.metadata.get('page_number', '?')}")
@@ -1,171 +1,369 @@
 import os
+import sys
 import json
 import requests
-import tempfile
-import shutil
-from typing import List, Dict, Any, Optional
-from langchain_community.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import shelve
+import hashlib
+import functools
+import threading
+import asyncio
+import aiohttp
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+import numpy as np
 from langchain.schema import Document
 import logging
 from pathlib import Path
 import re
 from datetime import datetime
 from dotenv import load_dotenv
-from pypdf import PdfReader
+import fitz  # PyMuPDF
+
+try:
+    from manual.create_vector_store import get_embeddings, get_chroma
+except ImportError:  # run as a script from inside manual/
+    from create_vector_store import get_embeddings, get_chroma
 
 # Load environment variables
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GROQ_CHAT_URL = "https://api.groq.com/openai/v1/chat/completions"
+
+# Fail fast if Groq can't be reached; completions themselves may take a while
+GROQ_TIMEOUT = (3, 30)  # (connect, read) seconds
+
+# One pooled keep-alive session for AI explanations (retries 429 and gateway errors)
+_GROQ_SESSION = requests.Session()
+_GROQ_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=frozenset({"POST"}), raise_on_status=False)
+))
+_GROQ_SESSION.headers.update({"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json", "Connection": "keep-alive"})
+
+# Static system message shared by every explanation request (built once, serialized by orjson)
+_MANUAL_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "You are a technical manual expert. Analyze the search results and provide a clear, helpful explanation. Focus on practical insights and actionable information."
+}
+
+# Shown instead of an AI explanation when no result clears min_ai_score
+NO_CONFIDENT_MATCH_MESSAGE = "ℹ️ No confident match in the manuals for this query, so no AI explanation was generated."
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Abbreviations and terms expanded in search queries
+_QUERY_EXPANSIONS = {
+    'temp': 'temperature',
+    'press': 'pressure',
+    'vib': 'vibration',
+    'rpm': 'rotations per minute',
+    'psi': 'pressure',
+    'err': 'error',
+    'troubleshoot': 'troubleshooting diagnosis problem',
+    'fix': 'repair solution troubleshooting',
+    'alarm': 'error alarm warning',
+    'fault': 'error fault problem',
+    'maintenance': 'maintenance service repair',
+    'calibration': 'calibration adjustment setup',
+    'installation': 'installation setup configuration'
+}
+# One alternation compiled once: a single pass over the query instead of a regex per term
+_QUERY_EXPANSION_RE = re.compile(r'\b(' + '|'.join(map(re.escape, _QUERY_EXPANSIONS)) + r')\b')
+
+@functools.lru_cache(maxsize=1024)
+def _expand_query(query: str) -> str:
+    """Lower-case a query and expand known abbreviations (memoized; UI users repeat queries)"""
+    return _QUERY_EXPANSION_RE.sub(lambda m: _QUERY_EXPANSIONS[m.group(1)], query.lower())
+
+def _extract_pdf(pdf_path: str) -> tuple:
+    """
+    (pdf_path, [(text, page_number, total_pages), ...]) for the pages of a PDF that have text.
+    Top-level so uploads can be parsed in worker processes; a failed file yields no pages.
+    """
+    pages = []
+    try:
+        # MuPDF parses the content streams in C, much faster than pypdf's per-operator Python
+        with fitz.open(pdf_path) as doc:
+            total_pages = doc.page_count
+            for page_num in range(total_pages):
+                text = doc.load_page(page_num).get_text("text")
+                if text.strip():
+                    pages.append((text, page_num + 1, total_pages))
+        logger.info(f"Processed {pdf_path}: {len(pages)} pages with content")
+    except Exception as e:
+        logger.error(f"Error processing PDF {pdf_path}: {str(e)}")
+    return pdf_path, pages
+
+def _pages_to_documents(pdf_path: str, pages: List[tuple], uploaded_at: str) -> List[Document]:
+    return [
+        Document(
+            page_content=text,
+            metadata={
+                'source': Path(pdf_path).name,
+                'page': page_number,
+                'total_pages': total_pages,
+                'uploaded_at': uploaded_at
+            }
+        )
+        for text, page_number, total_pages in pages
+    ]
+
 class ManualSearchTool:
-    def __init__(self, embedding_model: str = "all-MiniLM-L6-v2", custom_pdf_files: Optional[List[str]] = None):
+    def __init__(self, embedding_model: str = "all-MiniLM-L6-v2", custom_pdf_files: Optional[List[str]] = None,
+                 min_ai_score: float = 0.35):
         # Resolve data/vector_store relative to root
         base_dir = Path(__file__).resolve().parents[1]
         self.vector_store_dir = base_dir / "data" / "vector_store"
+        self.embedding_cache_path = base_dir / "data" / "embedding_cache"
+        self.pdf_cache_dir = base_dir / "data" / "pdf_cache"
         self.embedding_model = embedding_model
         self.vector_store = None
+        # Chroma distance -> cosine similarity is 1 - d * scale (set from the collection's hnsw:space)
+        self._distance_scale = 1.0
         self.embeddings = None
         self.custom_pdf_files = custom_pdf_files
-        self.temp_vector_store_dir = None
+        # Uploaded PDFs: page documents and their (N, dim) normalized embedding matrix
+        self._custom_documents: List[Document] = []
+        self._custom_matrix: Optional[np.ndarray] = None
+        # Query embeddings are memoized in memory and persisted on disk across restarts
+        self._embedding_cache = None
+        self._embedding_cache_lock = threading.Lock()
+        self._embed_query_cached = functools.lru_cache(maxsize=1024)(self._embed_query)
+        # Best cosine score a search needs before its results are worth a Groq explanation
+        self.min_ai_score = min_ai_score
+        # (query, result pages) -> explanation, so identical result sets don't go back to Groq
+        self._explanation_cache: OrderedDict = OrderedDict()
+        self._explanation_cache_lock = threading.Lock()
         self._initialize_tool()
 
     def _initialize_tool(self) -> None:
         logger.info("Initializing Manual Search Tool...")
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=self.embedding_model,
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
+        # Shared model and Chroma client: re-creating the tool doesn't reload them
+        self.embeddings = get_embeddings(self.embedding_model)
+        try:
+            self._embedding_cache = shelve.open(str(self.embedding_cache_path))
+        except Exception as e:
+            logger.warning(f"Query embedding cache unavailable, embeddings will not persist: {str(e)}")
         
         if self.custom_pdf_files:
-            # Create temporary vector store for custom PDFs
+            # Create in-memory embedding matrix for custom PDFs
             self._create_temporary_vector_store()
         else:
             # Use default vector store
             if not self.vector_store_dir.exists():
                 raise FileNotFoundError(f"Vector store directory not found: {self.vector_store_dir}")
-            self.vector_store = Chroma(
-                persist_directory=str(self.vector_store_dir),
-                embedding_function=self.embeddings,
-                collection_name="technical_manuals"
-            )
+            self.vector_store = get_chroma(str(self.vector_store_dir), "technical_manuals", self.embedding_model)
+            self._distance_scale = self._collection_distance_scale()
         
         logger.info("Manual Search Tool initialized successfully!")
 
+    def _collection_distance_scale(self) -> float:
+        """Scale that turns the store's distances into cosine similarity (stores built before the cosine space used L2)"""
+        collection = getattr(self.vector_store, "_collection", None)
+        space = ((collection.metadata if collection is not None else None) or {}).get("hnsw:space", "l2")
+        if space == "l2":
+            # Squared L2 between normalized vectors is 2 - 2*cos
+            logger.warning("Vector store uses L2 distance; rebuild it (delete data/vector_store) to switch to cosine. "
+                           "Converting scores to cosine similarity meanwhile.")
+            return 0.5
+        return 1.0
+
     def _create_temporary_vector_store(self) -> None:
-        """Create a temporary vector store from custom PDF files"""
+        """Embed custom PDF files into an in-memory matrix for exact top-k search"""
         try:
-            # Create temporary directory
-            self.temp_vector_store_dir = tempfile.mkdtemp(prefix="manual_vector_store_")
-            logger.info(f"Created temporary vector store at: {self.temp_vector_store_dir}")
-            
-            # Process PDF files and create documents
-            documents = []
+            # Re-uploaded PDFs (same bytes, same model) load their pages and embeddings from disk
+            cached = {}
+            cache_paths = {}
             for pdf_path in self.custom_pdf_files:
+                cache_paths[pdf_path] = self._pdf_cache_path(pdf_path)
+                entry = self._load_pdf_cache(cache_paths[pdf_path])
+                if entry is not None:
+                    cached[pdf_path] = entry
+            to_extract = [pdf_path for pdf_path in self.custom_pdf_files if pdf_path not in cached]
+            if cached:
+                logger.info(f"Reusing cached embeddings for {len(cached)} of {len(self.custom_pdf_files)} PDFs")
+
+            # Text extraction is CPU-bound Python, so parse the PDFs in parallel processes
+            workers = min(os.cpu_count() or 1, len(to_extract))
+            extracted = None
+            if workers > 1:
                 try:
-                    documents.extend(self._process_pdf_file(pdf_path))
-                except Exception as e:
-                    logger.error(f"Error processing PDF {pdf_path}: {str(e)}")
+                    with ProcessPoolExecutor(max_workers=workers) as pool:
+                        extracted = list(pool.map(_extract_pdf, to_extract))
+                except (OSError, BrokenProcessPool) as e:
+                    logger.warning(f"Process pool unavailable, extracting PDFs sequentially: {str(e)}")
+            if extracted is None:
+                extracted = [_extract_pdf(pdf_path) for pdf_path in to_extract]
+
+            # Embed the pages of every new PDF in one batched call, then cache them per file
+            new_texts = [text for _, pages in extracted for text, _, _ in pages]
+            new_vectors = np.asarray(self.embeddings.embed_documents(new_texts), dtype=np.float32) if new_texts else None
+            offset = 0
+            for pdf_path, pages in extracted:
+                vectors = new_vectors[offset:offset + len(pages)] if pages else np.empty((0, 0), dtype=np.float32)
+                offset += len(pages)
+                cached[pdf_path] = (pages, vectors)
+                if pages:
+                    self._save_pdf_cache(cache_paths[pdf_path], pages, vectors)
+
+            # Process PDF files and create documents (in upload order)
+            documents = []
+            matrices = []
+            uploaded_at = datetime.now().isoformat()
+            for pdf_path in self.custom_pdf_files:
+                pages, vectors = cached[pdf_path]
+                if pages:
+                    documents.extend(_pages_to_documents(pdf_path, pages, uploaded_at))
+                    matrices.append(vectors)
             
             if not documents:
                 raise ValueError("No valid documents could be extracted from the uploaded PDFs")
             
-            # Create vector store
-            self.vector_store = Chroma.from_documents(
-                documents=documents,
-                embedding=self.embeddings,
-                persist_directory=self.temp_vector_store_dir,
-                collection_name="custom_manuals"
-            )
+            # Uploads are a few thousand pages at most, so exact search is one matrix-vector
+            # product over the normalized embeddings (cosine similarity) instead of an ANN index
+            self._custom_matrix = np.concatenate(matrices)
+            self._custom_documents = documents
             
-            logger.info(f"Created temporary vector store with {len(documents)} documents")
+            logger.info(f"Created in-memory vector store with {len(documents)} documents")
             
         except Exception as e:
             logger.error(f"Error creating temporary vector store: {str(e)}")
             raise
 
-    def _process_pdf_file(self, pdf_path: str) -> List[Document]:
-        """Process a PDF file and extract text content"""
-        documents = []
+    def _embedding_model_id(self) -> str:
+        """Model name plus backend: vectors from the int8 ONNX model differ slightly from the PyTorch ones"""
+        backend = getattr(self.embeddings, "backend", "torch")
+        return self.embedding_model if backend == "torch" else f"{self.embedding_model}:{backend}"
+
+    def _pdf_cache_path(self, pdf_path: str) -> Path:
+        """Content-addressed cache file for a PDF: sha256 of its bytes plus the embedding model"""
+        with open(pdf_path, "rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+        model_key = hashlib.sha256(self._embedding_model_id().encode()).hexdigest()[:16]
+        return self.pdf_cache_dir / f"{digest}-{model_key}.npz"
+
+    def _load_pdf_cache(self, cache_path: Path) -> Optional[tuple]:
+        """(pages, embeddings) from a cached upload, or None on a miss or unreadable file"""
+        if not cache_path.exists():
+            return None
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PdfReader(file)
-                
-                for page_num, page in enumerate(pdf_reader.pages):
-                    text = page.extract_text()
-                    if text.strip():
-                        # Create document with metadata
-                        doc = Document(
-                            page_content=text,
-                            metadata={
-                                'source': Path(pdf_path).name,
-                                'page': page_num + 1,
-                                'total_pages': len(pdf_reader.pages),
-                                'uploaded_at': datetime.now().isoformat()
-                            }
-                        )
-                        documents.append(doc)
-                
-                logger.info(f"Processed {pdf_path}: {len(documents)} pages with content")
-                
+            with np.load(cache_path) as cache:
+                pages = list(zip(cache["texts"].tolist(), cache["pages"].tolist(), cache["totals"].tolist()))
+                return pages, cache["embeddings"]
         except Exception as e:
-            logger.error(f"Error processing PDF {pdf_path}: {str(e)}")
-            raise
-        
-        return documents
+            logger.warning(f"Ignoring unreadable PDF cache {cache_path.name}: {str(e)}")
+            return None
+
+    def _save_pdf_cache(self, cache_path: Path, pages: List[tuple], vectors: np.ndarray) -> None:
+        try:
+            self.pdf_cache_dir.mkdir(parents=True, exist_ok=True)
+            texts, page_numbers, totals = zip(*pages)
+            # Write then rename, so a concurrent upload never reads a half-written file
+            tmp_path = cache_path.with_suffix(".tmp.npz")
+            np.savez(tmp_path, texts=np.array(texts), pages=np.array(page_numbers),
+                     totals=np.array(totals), embeddings=vectors)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            logger.warning(f"Could not cache embeddings for {cache_path.name}: {str(e)}")
+
+    def _process_pdf_file(self, pdf_path: str) -> List[Document]:
+        """Process a PDF file and extract text content"""
+        _, pages = _extract_pdf(pdf_path)
+        return _pages_to_documents(pdf_path, pages, datetime.now().isoformat())
+
+    def _embed_query(self, text: str) -> tuple:
+        """Embed a query, reusing the on-disk cache (keyed by sha256 of model, backend and text)"""
+        key = hashlib.sha256(f"{self._embedding_model_id()}\n{text}".encode()).hexdigest()
+        if self._embedding_cache is not None:
+            with self._embedding_cache_lock:
+                cached = self._embedding_cache.get(key)
+            if cached is not None:
+                return cached
+
+        embedding = tuple(self.embeddings.embed_query(text))
+        if self._embedding_cache is not None:
+            with self._embedding_cache_lock:
+                self._embedding_cache[key] = embedding
+        return embedding
+
+    def embed_query(self, text: str) -> List[float]:
+        """Normalized embedding for a query string (memoized)"""
+        return list(self._embed_query_cached(text))
+
+    def embed_search_query(self, query: str) -> List[float]:
+        """
+        Embedding search() will use for this query. Callers that embed queries themselves
+        (e.g. semantic result caches) should use this, so a following search() reuses the
+        memoized vector instead of running the encoder a second time.
+        """
+        return self.embed_query(self._preprocess_query(query))
 
     def cleanup(self) -> None:
-        """Clean up temporary files and directories"""
-        if self.temp_vector_store_dir and os.path.exists(self.temp_vector_store_dir):
-            try:
-                shutil.rmtree(self.temp_vector_store_dir)
-                logger.info(f"Cleaned up temporary vector store: {self.temp_vector_store_dir}")
-            except Exception as e:
-                logger.error(f"Error cleaning up temporary vector store: {str(e)}")
+        """Close the query embedding cache"""
+        if self._embedding_cache is not None:
+            with self._embedding_cache_lock:
+                self._embedding_cache.close()
+                self._embedding_cache = None
+
+    def _explanation_payload(self, query: str, search_results: List[Dict[str, Any]]) -> dict:
+        """Groq request body asking for an explanation of the search results"""
+        # Format search results for the AI
+        results_text = "\n\n".join([
+            f"Result {i+1} (Score: {result['relevance_score']:.3f}):\n"
+            f"Source: {result['metadata']['source']} - Page {result['metadata']['page']}\n"
+            f"Content: {result['content']}"
+            for i, result in enumerate(search_results)
+        ])
+        return {
+            "model": "llama3-8b-8192",
+            "messages": [
+                _MANUAL_SYSTEM_MESSAGE,
+                {
+                    "role": "user", 
+                    "content": f"Query: {query}\n\nSearch Results:\n{results_text}\n\nPlease provide a clear explanation of what was found and any relevant insights."
+                }
+            ],
+            "temperature": 0.3
+        }
+
+    def _should_explain(self, search_results: List[Dict[str, Any]]) -> bool:
+        """Only confident matches get an AI explanation; weak hits aren't worth a Groq round trip"""
+        return bool(search_results) and search_results[0]["relevance_score"] >= self.min_ai_score
 
     def _get_ai_explanation(self, query: str, search_results: List[Dict[str, Any]]) -> str:
         """Get AI-powered explanation using Groq API"""
         if not GROQ_API_KEY:
             return "⚠️ Groq API key not configured. Install dotenv and set GROQ_API_KEY for AI explanations."
+
+        cache_key = (query, tuple((r["metadata"]["source"], r["metadata"]["page"]) for r in search_results))
+        with self._explanation_cache_lock:
+            if cache_key in self._explanation_cache:
+                self._explanation_cache.move_to_end(cache_key)
+                return self._explanation_cache[cache_key]
         
         try:
-            # Format search results for the AI
-            results_text = "\n\n".join([
-                f"Result {i+1} (Score: {result['relevance_score']:.3f}):\n"
-                f"Source: {result['metadata']['source']} - Page {result['metadata']['page']}\n"
-                f"Content: {result['content']}"
-                for i, result in enumerate(search_results)
-            ])
-            
-            response = requests.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {GROQ_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "llama3-8b-8192",
-                    "messages": [
-                        {
-                            "role": "system", 
-                            "content": "You are a technical manual expert. Analyze the search results and provide a clear, helpful explanation. Focus on practical insights and actionable information."
-                        },
-                        {
-                            "role": "user", 
-                            "content": f"Query: {query}\n\nSearch Results:\n{results_text}\n\nPlease provide a clear explanation of what was found and any relevant insights."
-                        }
-                    ],
-                    "temperature": 0.3
-                }
+            response = _GROQ_SESSION.post(
+                GROQ_CHAT_URL,
+                data=orjson.dumps(self._explanation_payload(query, search_results)),
+                timeout=GROQ_TIMEOUT
             )
             
             if response.status_code == 200:
-                return response.json()["choices"][0]["message"]["content"]
+                explanation = orjson.loads(response.content)["choices"][0]["message"]["content"]
+                # Only successful answers are cached; errors should be retried next time
+                with self._explanation_cache_lock:
+                    self._explanation_cache[cache_key] = explanation
+                    if len(self._explanation_cache) > 256:
+                        self._explanation_cache.popitem(last=False)
+                return explanation
             else:
                 return f"❌ Groq API error: {response.status_code}"
                 
@@ -173,19 +371,96 @@ class ManualSearchTool:
             logger.error(f"Error getting AI explanation: {str(e)}")
             return f"⚠️ AI explanation unavailable: {str(e)}"
 
-    def search(self, query: str, top_k: int = 5, filter_metadata: Optional[Dict] = None, include_ai_explanation: bool = True) -> Dict[str, Any]:
-        logger.info(f"Searching for: '{query}' (top_k={top_k})")
-        if not query.strip():
-            logger.warning("Empty query provided")
-            return {"results": [], "ai_explanation": "No query provided"}
+    def _stream_ai_explanation(self, query: str, search_results: List[Dict[str, Any]]) -> Iterator[str]:
+        """Streaming variant of _get_ai_explanation: yields the explanation text as Groq writes it"""
+        if not GROQ_API_KEY:
+            yield "⚠️ Groq API key not configured. Install dotenv and set GROQ_API_KEY for AI explanations."
+            return
 
-        processed_query = self._preprocess_query(query)
+        try:
+            with _GROQ_SESSION.post(
+                GROQ_CHAT_URL,
+                data=orjson.dumps({**self._explanation_payload(query, search_results), "stream": True}),
+                timeout=GROQ_TIMEOUT,
+                stream=True
+            ) as response:
+                if response.status_code != 200:
+                    yield f"❌ Groq API error: {response.status_code}"
+                    return
+                # Server-sent events: one "data: {chunk}" line per delta, ending with "data: [DONE]"
+                for line in response.iter_lines():
+                    if not line.startswith(b"data: "):
+                        continue
+                    data = line[6:]
+                    if data == b"[DONE]":
+                        break
+                    delta = orjson.loads(data)["choices"][0]["delta"].get("content")
+                    if delta:
+                        yield delta
 
-        results = self.vector_store.similarity_search_with_score(
-            processed_query,
-            k=top_k,
-            filter=filter_metadata if filter_metadata else None
-        )
+        except Exception as e:
+            logger.error(f"Error getting AI explanation: {str(e)}")
+            yield f"⚠️ AI explanation unavailable: {str(e)}"
+
+    async def _get_ai_explanation_async(self, session: aiohttp.ClientSession, query: str,
+                                        search_results: List[Dict[str, Any]]) -> str:
+        """Async variant of _get_ai_explanation on a shared aiohttp session"""
+        if not GROQ_API_KEY:
+            return "⚠️ Groq API key not configured. Install dotenv and set GROQ_API_KEY for AI explanations."
+
+        try:
+            async with session.post(GROQ_CHAT_URL, data=orjson.dumps(self._explanation_payload(query, search_results))) as response:
+                body = await response.read()
+                if response.status == 200:
+                    return orjson.loads(body)["choices"][0]["message"]["content"]
+                return f"❌ Groq API error: {response.status}"
+
+        except Exception as e:
+            logger.error(f"Error getting AI explanation: {str(e)}")
+            return f"⚠️ AI explanation unavailable: {str(e)}"
+
+    def _search_custom(self, query_embedding: List[float], top_k: int,
+                       filter_metadata: Optional[Dict] = None) -> List[tuple]:
+        """Exact top-k over the uploaded PDFs' embedding matrix: (doc, cosine similarity) pairs"""
+        scores = self._custom_matrix @ np.asarray(query_embedding, dtype=np.float32)
+        candidates = len(self._custom_documents)
+        if filter_metadata:
+            keep = np.fromiter(
+                (all(doc.metadata.get(key) == value for key, value in filter_metadata.items())
+                 for doc in self._custom_documents),
+                dtype=bool,
+                count=candidates
+            )
+            scores = np.where(keep, scores, -np.inf)
+            candidates = int(keep.sum())
+
+        k = min(top_k, candidates)
+        if k <= 0:
+            return []
+        # argpartition finds the k best in O(N); only those k get sorted
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._custom_documents[i], scores[i]) for i in top]
+
+    def _search_results(self, query: str, top_k: int = 5, filter_metadata: Optional[Dict] = None,
+                        query_embedding: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+        """Vector search part of search(): ranked results with cosine-similarity scores"""
+        # Callers may pass a precomputed embedding of the preprocessed query
+        if query_embedding is None:
+            query_embedding = self.embed_search_query(query)
+
+        if self._custom_matrix is not None:
+            # Inner product of normalized vectors is already the cosine similarity
+            results = self._search_custom(query_embedding, top_k, filter_metadata)
+        else:
+            # Chroma returns a distance; convert it to cosine similarity for the store's space
+            results = [
+                (doc, 1 - score * self._distance_scale) for doc, score in self.vector_store.similarity_search_by_vector_with_relevance_scores(
+                    query_embedding,
+                    k=top_k,
+                    filter=filter_metadata if filter_metadata else None
+                )
+            ]
 
         formatted_results = []
         for i, (doc, score) in enumerate(results):
@@ -195,15 +470,28 @@ class ManualSearchTool:
                     "source": doc.metadata.get('source', 'Unknown'),
                     "page": doc.metadata.get('page', 'Unknown'),
                 },
-                "relevance_score": float(1 - score),
+                "relevance_score": float(score),
                 "rank": i + 1
             }
             formatted_results.append(result)
+        return formatted_results
+
+    def search(self, query: str, top_k: int = 5, filter_metadata: Optional[Dict] = None, include_ai_explanation: bool = True,
+               query_embedding: Optional[List[float]] = None) -> Dict[str, Any]:
+        logger.info(f"Searching for: '{query}' (top_k={top_k})")
+        if not query.strip():
+            logger.warning("Empty query provided")
+            return {"results": [], "ai_explanation": "No query provided"}
+
+        formatted_results = self._search_results(query, top_k, filter_metadata, query_embedding)
 
-        # Get AI explanation if requested and API key is available
+        # Get AI explanation if requested, API key is available and the best match is confident
         ai_explanation = ""
         if include_ai_explanation and formatted_results:
-            ai_explanation = self._get_ai_explanation(query, formatted_results)
+            if self._should_explain(formatted_results):
+                ai_explanation = self._get_ai_explanation(query, formatted_results)
+            else:
+                ai_explanation = NO_CONFIDENT_MATCH_MESSAGE
 
         logger.info(f"Found {len(formatted_results)} results")
         return {
@@ -212,26 +500,53 @@ class ManualSearchTool:
             "total_results": len(formatted_results)
         }
 
+    def search_stream(self, query: str, top_k: int = 5,
+                      filter_metadata: Optional[Dict] = None) -> Tuple[Dict[str, Any], Iterator[str]]:
+        """
+        Like search(), but the AI explanation is streamed: returns the results right away plus an
+        iterator over explanation text chunks, so callers can print them as they arrive.
+        """
+        results = self.search(query, top_k, filter_metadata, include_ai_explanation=False)
+        if not results["results"]:
+            return results, iter(())
+        if not self._should_explain(results["results"]):
+            return results, iter((NO_CONFIDENT_MATCH_MESSAGE,))
+        return results, self._stream_ai_explanation(query, results["results"])
+
+    async def search_many(self, queries: List[str], top_k: int = 5, include_ai_explanation: bool = True) -> List[Dict[str, Any]]:
+        """
+        Search several queries at once: vector searches run in worker threads and the Groq
+        explanations are requested concurrently, so the wall clock is roughly the slowest call.
+        Usage: asyncio.run(tool.search_many(["pump leak", "error 503"]))
+        """
+        queries = [query for query in queries if query.strip()]
+        all_results = await asyncio.gather(
+            *[asyncio.to_thread(self._search_results, query, top_k) for query in queries]
+        )
+
+        explanations = [""] * len(queries)
+        if include_ai_explanation:
+            async with aiohttp.ClientSession(
+                headers={"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"},
+                timeout=aiohttp.ClientTimeout(connect=GROQ_TIMEOUT[0], total=GROQ_TIMEOUT[1])
+            ) as session:
+                pending = [
+                    self._get_ai_explanation_async(session, query, results)
+                    for query, results in zip(queries, all_results) if self._should_explain(results)
+                ]
+                answered = iter(await asyncio.gather(*pending))
+                explanations = [
+                    next(answered) if self._should_explain(results) else NO_CONFIDENT_MATCH_MESSAGE if results else ""
+                    for results in all_results
+                ]
+
+        return [
+            {"query": query, "results": results, "ai_explanation": explanation, "total_results": len(results)}
+            for query, results, explanation in zip(queries, all_results, explanations)
+        ]
+
     def _preprocess_query(self, query: str) -> str:
-        query_mapping = {
-            'temp': 'temperature',
-            'press': 'pressure',
-            'vib': 'vibration',
-            'rpm': 'rotations per minute',
-            'psi': 'pressure',
-            'err': 'error',
-            'troubleshoot': 'troubleshooting diagnosis problem',
-            'fix': 'repair solution troubleshooting',
-            'alarm': 'error alarm warning',
-            'fault': 'error fault problem',
-            'maintenance': 'maintenance service repair',
-            'calibration': 'calibration adjustment setup',
-            'installation': 'installation setup configuration'
-        }
-        processed_query = query.lower()
-        for abbr, full_form in query_mapping.items():
-            processed_query = re.sub(r'\b' + abbr + r'\b', full_form, processed_query)
-        return processed_query
+        return _expand_query(query)
 
     def search_by_error_code(self, error_code: str, top_k: int = 3) -> Dict[str, Any]:
         query = f"error code {error_code} troubleshooting diagnosis solution"
@@ -261,7 +576,10 @@ class ManualSearchTool:
             else:
                 processing_metadata = {}
 
-            collection_info = self.vector_store._collection.count()
+            if self._custom_matrix is not None:
+                collection_info = len(self._custom_documents)
+            else:
+                collection_info = self.vector_store._collection.count()
 
             return {
                 "tool_name": "Manual Search Tool",
@@ -330,8 +648,10 @@ if __name__ == "__main__":
             continue
 
         try:
+            explanation_stream = None
             if choice == "1":
-                results = tool.search(query)
+                # Print the matches right away and the AI explanation as it is generated
+                results, explanation_stream = tool.search_stream(query)
             elif choice == "2":
                 results = tool.search_without_ai(query)
             elif choice == "3":
@@ -363,7 +683,19 @@ if __name__ == "__main__":
                 print(f"  📝 Content: {result['content']}\n")
 
             # Display AI explanation if available
-            if results.get("ai_explanation"):
+            if explanation_stream is not None:
+                first_chunk = next(explanation_stream, None)
+                if first_chunk is not None:
+                    print("\n🤖 AI Explanation:")
+                    print("=" * 50)
+                    sys.stdout.write(first_chunk)
+                    sys.stdout.flush()
+                    for chunk in explanation_stream:
+                        sys.stdout.write(chunk)
+                        sys.stdout.flush()
+                    print()
+                    print("=" * 50)
+            elif results.get("ai_explanation"):
                 print("\n🤖 AI Explanation:")
                 print("=" * 50)
                 print(results["ai_explanation"])
@@ -1,29 +1,113 @@
 import os
+import re
+from functools import lru_cache
 import requests
+import orjson
+import ahocorasick
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.sql.elements import TextClause
 from typing import Optional, Dict, Any
 import numpy as np
 
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GROQ_CHAT_URL = "https://api.groq.com/openai/v1/chat/completions"
+
+# Fail fast if Groq can't be reached; completions themselves may take a while
+GROQ_TIMEOUT = (3, 30)  # (connect, read) seconds
+
+# One pooled keep-alive session for the explanation/fallback calls (retries 429 and gateway errors)
+_GROQ_SESSION = requests.Session()
+_GROQ_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=frozenset({"POST"}), raise_on_status=False)
+))
+_GROQ_SESSION.headers.update({"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json", "Connection": "keep-alive"})
+
+# Static system messages for the two Groq calls, built once and shared by every request
+_FALLBACK_SYSTEM_MESSAGE = {"role": "system", "content": "You are a SCADA diagnostics assistant."}
+_EXPLAIN_SYSTEM_MESSAGE = {
+    "role": "system",
+    "content": "You are a helpful diagnostics assistant. Analyze the SCADA data and explain it simply."
+}
 
 # Adjust path for LangGraph compatibility
 base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_PATH = os.path.join(base_dir, "data", "scada_data.db")
+# Built once per process. create_engine doesn't connect, so this is safe before the DB is generated;
+# SQLAlchemy's default QueuePool for file SQLite then reuses connections across queries and threads.
+# The tool only reads: the DB is opened read-only and immutable (no locking or change detection),
+# so restart the process after regenerating scada_data.db
+_ENGINE = create_engine(f"sqlite:///file:{DB_PATH}?mode=ro&immutable=1&uri=true")
+
+@event.listens_for(_ENGINE, "connect")
+def _configure_read_connection(dbapi_connection, connection_record):
+    """Memory-map the DB file and give each pooled connection a larger page cache"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA mmap_size=268435456")  # 256 MB: reads come straight from the page cache
+    cursor.execute("PRAGMA cache_size=-65536")    # 64 MB
+    cursor.execute("PRAGMA query_only=1")
+    cursor.close()
 
 month_map = {
     "january": "01", "february": "02", "march": "03", "april": "04",
     "may": "05", "june": "06", "july": "07", "august": "08",
     "september": "09", "october": "10", "november": "11", "december": "12"
 }
+# Whole month names only, so words like "maybe" don't read as May
+_MONTH_RE = re.compile(r"\b(" + "|".join(month_map) + r")\b", re.IGNORECASE)
+
+# Question keywords -> SQL, in priority order: the first entry with a keyword in the question wins
+_KEYWORD_QUERIES = [
+    (["pressure", "psi", "capper", "compressor", "bar", "leak"],
+     "SELECT * FROM scada_logs WHERE metric_name='pressure_psi'"),
+    (["temperature", "temp", "celsius", "overheat", "boiler", "furnace", "chiller"],
+     "SELECT * FROM scada_logs WHERE metric_name='temperature_celsius'"),
+    (["vibration", "shake", "hz", "unbalance", "resonance", "oscillation"],
+     "SELECT * FROM scada_logs WHERE metric_name='vibration_hz'"),
+    (["load", "power", "grid", "electric", "kw", "average load", "main supply"],
+     "SELECT AVG(value) as avg_kw FROM scada_logs WHERE metric_name='load_kw'"),
+    (["rpm", "rotation", "overspeed", "underspeed", "shaft speed"],
+     "SELECT * FROM scada_logs WHERE metric_name='rpm'"),
+    (["error", "anomaly", "fault", "issue", "warning", "alarm", "problem", "503", "504", "505"],
+     "SELECT * FROM scada_logs WHERE error_code IS NOT NULL"),
+]
+
+# One automaton over every keyword (substring matches, like the old `word in q` checks),
+# so a question is scanned once instead of once per keyword
+_KEYWORD_AUTOMATON = ahocorasick.Automaton()
+for _priority, (_keywords, _) in enumerate(_KEYWORD_QUERIES):
+    for _keyword in _keywords:
+        _KEYWORD_AUTOMATON.add_word(_keyword, _priority)
+_KEYWORD_AUTOMATON.make_automaton()
+
+def match_keyword_query(q: str) -> Optional[str]:
+    """SQL for the highest-priority keyword group found in the (lower-cased) question"""
+    priorities = [priority for _, priority in _KEYWORD_AUTOMATON.iter(q)]
+    return _KEYWORD_QUERIES[min(priorities)][1] if priorities else None
+
+@lru_cache(maxsize=32)
+def build_statement(query: str, has_month: bool) -> TextClause:
+    """
+    Parameterized statement for a keyword query. The month is bound rather than interpolated,
+    so every month shares one SQL string and SQLite's prepared-statement cache.
+    """
+    if has_month:
+        # Same expression as the idx_month index, so SQLite can use it
+        query += " AND substr(timestamp, 6, 2) = :month"
+    if "AVG" not in query:
+        query += " ORDER BY timestamp DESC LIMIT 10"
+    return text(query)
 
 def extract_month(q: str) -> Optional[str]:
-    for month_name, month_num in month_map.items():
-        if month_name in q:
-            return month_num
-    return None
+    """Two-digit month number for the first month named in the question, if any"""
+    match = _MONTH_RE.search(q)
+    return month_map[match.group(1).lower()] if match else None
 
 def process_custom_scada_data(df: pd.DataFrame, question: str, month_filter: Optional[str] = None) -> str:
     """Process custom SCADA data and answer questions about it"""
@@ -38,16 +122,21 @@ def process_custom_scada_data(df: pd.DataFrame, question: str, month_filter: Opt
         
         # Filter by month if specified
         if month_filter and date_columns:
-            # Try to find a date column and filter by month
-            for date_col in date_columns:
-                try:
-                    df[date_col] = pd.to_datetime(df[date_col])
-                    df_filtered = df[df[date_col].dt.month == month_filter]
-                    if not df_filtered.empty:
-                        df = df_filtered
-                        break
-                except:
-                    continue
+            # Pick the date column once (already datetime, or text that may hold dates) and parse it
+            # in a single pass; pandas infers the format from the first value and reuses it, and
+            # unparseable cells become NaT instead of aborting the whole column
+            date_col = next(
+                (col for col in date_columns
+                 if pd.api.types.is_datetime64_any_dtype(df[col])
+                 or pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col])),
+                None
+            )
+            if date_col is not None:
+                parsed = pd.to_datetime(df[date_col], errors="coerce", cache=True)
+                # extract_month returns "03"-style strings; dt.month is an int
+                df_filtered = df.loc[(parsed.dt.month == int(month_filter)).to_numpy()]
+                if not df_filtered.empty:
+                    df = df_filtered
         
         # Answer based on question type
         q = question.lower()
@@ -87,7 +176,6 @@ def process_custom_scada_data(df: pd.DataFrame, question: str, month_filter: Opt
 def query_scada(nl_question: str, custom_data: Optional[Dict[str, Any]] = None) -> str:
     q = nl_question.lower()
     month_filter = extract_month(q)
-    query = None
     
     # Use custom data if provided, otherwise use default database
     if custom_data and custom_data.get('data'):
@@ -96,81 +184,60 @@ def query_scada(nl_question: str, custom_data: Optional[Dict[str, Any]] = None)
         return process_custom_scada_data(df, nl_question, month_filter)
     
     # Use default database
-    engine = create_engine(f"sqlite:///{DB_PATH}")
-
-    if any(word in q for word in ["pressure", "psi", "capper", "compressor", "bar", "leak"]):
-        query = "SELECT * FROM scada_logs WHERE metric_name='pressure_psi'"
-    elif any(word in q for word in ["temperature", "temp", "celsius", "overheat", "boiler", "furnace", "chiller"]):
-        query = "SELECT * FROM scada_logs WHERE metric_name='temperature_celsius'"
-    elif any(word in q for word in ["vibration", "shake", "hz", "unbalance", "resonance", "oscillation"]):
-        query = "SELECT * FROM scada_logs WHERE metric_name='vibration_hz'"
-    elif any(word in q for word in ["load", "power", "grid", "electric", "kw", "average load", "main supply"]):
-        query = "SELECT AVG(value) as avg_kw FROM scada_logs WHERE metric_name='load_kw'"
-    elif any(word in q for word in ["rpm", "rotation", "overspeed", "underspeed", "shaft speed"]):
-        query = "SELECT * FROM scada_logs WHERE metric_name='rpm'"
-    elif any(word in q for word in ["error", "anomaly", "fault", "issue", "warning", "alarm", "problem", "503", "504", "505"]):
-        query = "SELECT * FROM scada_logs WHERE error_code IS NOT NULL"
-
-    if query:
-        if month_filter:
-            query += f" AND strftime('%m', timestamp) = '{month_filter}'"
-        if "AVG" not in query:
-            query += " ORDER BY timestamp DESC LIMIT 10;"
-        else:
-            query += ";"
-    else:
+    query = match_keyword_query(q)
+
+    if not query:
         return fallback_response(nl_question)
 
     try:
-        df = pd.read_sql(query, engine)
+        df = pd.read_sql(
+            build_statement(query, month_filter is not None),
+            _ENGINE,
+            params={"month": month_filter} if month_filter else None
+        )
     except Exception as e:
         return f"❌ SQL Query Error: {str(e)}"
 
     if df.empty:
         return "⚠️ No data matched your query."
 
-    result_text = df.to_string(index=False)
+    # Plain CSV: to_string pads every column to its widest value, which Groq bills as input tokens
+    result_text = df.head(10).to_csv(index=False, lineterminator="\n")
     return explain_data_with_llm(result_text)
 
 def fallback_response(nl_question: str) -> str:
-    response = requests.post(
-        "https://api.groq.com/openai/v1/chat/completions",
-        headers={
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        },
-        json={
+    response = _GROQ_SESSION.post(
+        GROQ_CHAT_URL,
+        data=orjson.dumps({
             "model": "llama3-8b-8192",
             "messages": [
-                {"role": "system", "content": "You are a SCADA diagnostics assistant."},
+                _FALLBACK_SYSTEM_MESSAGE,
                 {"role": "user", "content": nl_question}
             ],
             "temperature": 0.4
-        }
+        }),
+        timeout=GROQ_TIMEOUT
     )
     if response.status_code == 200:
-        return response.json()["choices"][0]["message"]["content"]
+        return orjson.loads(response.content)["choices"][0]["message"]["content"]
     else:
         return f"❌ Groq fallback error: {response.text}"
 
 def explain_data_with_llm(data_str: str) -> str:
-    response = requests.post(
-        "https://api.groq.com/openai/v1/chat/completions",
-        headers={
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        },
-        json={
+    response = _GROQ_SESSION.post(
+        GROQ_CHAT_URL,
+        data=orjson.dumps({
             "model": "llama3-8b-8192",
             "messages": [
-                {"role": "system", "content": "You are a helpful diagnostics assistant. Analyze the SCADA data and explain it simply."},
+                _EXPLAIN_SYSTEM_MESSAGE,
                 {"role": "user", "content": f"Explain this data:\n\n{data_str}"}
             ],
             "temperature": 0.3
-        }
+        }),
+        timeout=GROQ_TIMEOUT
     )
     if response.status_code == 200:
-        return response.json()["choices"][0]["message"]["content"]
+        return orjson.loads(response.content)["choices"][0]["message"]["content"]
     else:
         return f"❌ Groq API error: {response.text}"
 
@@ -1,14 +1,38 @@
+import asyncio
+import time
+
 # Global variables for human decision
 human_decision = None
+awaiting_input = False
+
+# Set whenever a decision arrives so the orchestrator can await it instead of polling
+decision_event = asyncio.Event()
+# Loop the orchestrator is waiting on; asyncio.Event isn't thread-safe, so callers on other
+# threads (sync handlers, worker threads) hand set/clear over to that loop
+_waiting_loop = None
+
+def _call_on_waiting_loop(callback):
+    """Run callback on the waiting orchestrator's loop, directly if we're already on it"""
+    loop = _waiting_loop
+    try:
+        current_loop = asyncio.get_running_loop()
+    except RuntimeError:  # Called from a plain thread
+        current_loop = None
+    if loop is None or loop.is_closed() or loop is current_loop:
+        callback()
+    else:
+        loop.call_soon_threadsafe(callback)
 
 def set_decision(choice: str, feedback: str = None):
     """Set the human decision choice and optional natural language feedback"""
     global human_decision
+    # Swap in a complete dict in one assignment so readers never see a half-built decision
     human_decision = {
         "choice": choice,
         "feedback": feedback,
-        "timestamp": None  # Will be set when decision is processed
+        "timestamp": time.time()
     }
+    _call_on_waiting_loop(decision_event.set)
 
 def get_decision():
     """Get the current human decision (returns dict with choice and feedback)"""
@@ -33,6 +57,26 @@ def clear_decision():
     """Clear the current human decision"""
     global human_decision
     human_decision = None
+    _call_on_waiting_loop(decision_event.clear)
+
+async def wait_for_decision(timeout: float):
+    """Wait until a human decision is set; returns it, or None if the timeout expires first"""
+    global _waiting_loop
+    _waiting_loop = asyncio.get_running_loop()
+    try:
+        await asyncio.wait_for(decision_event.wait(), timeout)
+    except asyncio.TimeoutError:
+        return None
+    return human_decision
+
+def set_awaiting_input(awaiting: bool):
+    """Mark whether the workflow is paused for a human decision"""
+    global awaiting_input
+    awaiting_input = awaiting
+
+def is_awaiting_input():
+    """Check if the workflow is paused for a human decision"""
+    return awaiting_input
 
 def is_awaiting_decision():
     """Check if we're waiting for a human decision"""
@@ -45,3 +89,17 @@ def has_feedback():
         feedback = human_decision.get("feedback")
         return feedback is not None and feedback.strip() != ""
     return False
+
+def snapshot():
+    """Get the whole decision state in one call, read from a single consistent decision"""
+    decision = human_decision
+    if decision is not None and not isinstance(decision, dict):
+        decision = {"choice": decision, "feedback": None}
+    feedback = decision.get("feedback") if decision else None
+    return {
+        "decision": decision,
+        "choice": decision.get("choice") if decision else None,
+        "feedback": feedback,
+        "has_feedback": feedback is not None and feedback.strip() != "",
+        "awaiting": decision is None
+    }
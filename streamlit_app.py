@@ -5,10 +5,99 @@ Simple Readable SentientGrid Frontend - Just make existing output cleaner
 import streamlit as st
 import time
 import requests
+from requests.adapters import HTTPAdapter
 import os
+import re
+import functools
 from typing import Optional, Dict
 import json
 
+# API request timeouts, (connect, read) seconds
+POLL_TIMEOUT = (1, 3)
+COMMAND_TIMEOUT = (3, 10)
+
+# Leading "**00:48:01**" timestamp on terminal messages
+_TS_RE = re.compile(r'^\*\*\d{2}:\d{2}:\d{2}\*\*\s*')
+
+# Debug and HTTP log messages that are hidden from the output
+_SKIP_PATTERNS = (
+    "Still waiting",
+    "127.0.0.1",
+    "HTTP/1.1",
+    "INFO:",
+    "GET /api",
+    "POST /api",
+    "--- Execution Loop Iteration",
+    "--- Executor Step ---",
+    "ExecutorAgent: Executing step:",
+    "ScadaAgent: Querying SCADA",
+    "ManualAgent: Searching manuals",
+    "ScadaAgent: SCADA query successful",
+    "ManualAgent: Manual search successful"
+)
+
+# Detailed human loop text; only the essential parts are shown
+_HUMAN_SKIP_PATTERNS = (
+    "--- HUMAN IN THE LOOP: Review Required ---",
+    "Current State Overview:",
+    "User Query:",
+    "Result Preview:",
+    "Options:",
+    "'c' / 'continue':",
+    "'s' / 'synthesize':",
+    "'e' / 'edit':",
+    "'q' / 'quit':"
+)
+
+# One alternation per list: a single scan of the message instead of one `in` check per pattern
+_SKIP_RE = re.compile('|'.join(map(re.escape, _SKIP_PATTERNS)))
+_HUMAN_SKIP_RE = re.compile('|'.join(map(re.escape, _HUMAN_SKIP_PATTERNS)))
+
+# Quick example queries for the examples panel
+_EXAMPLES = (
+    "Pressure is high, what should I do?",
+    "What's the pressure in March?",
+    "Check SCADA readings",
+    "Find troubleshooting procedures"
+)
+_FOLLOW_UP_EXAMPLES = (
+    "What about the temperature data from my last query?",
+    "Check the pressure trends we discussed earlier",
+    "Compare with previous results",
+    "What else should I check?"
+)
+
+# What each human decision choice does
+_CHOICE_MEANINGS = {
+    "c": "Continue with current plan (feedback modifies existing steps)",
+    "e": "Edit plan using feedback (replaces with new AI-generated plan)",
+    "s": "Synthesize final answer now (incorporates feedback if provided)",
+    "q": "Quit the workflow"
+}
+
+_DECISION_HELP = """
+**Decision Interface:**
+- **Continue**: Proceed with the current plan (feedback optional - adds to existing plan)
+- **✏️ Edit**: Replace current plan with new AI-generated plan (feedback required)
+- **Synthesize**: Force the system to provide a final answer now (feedback optional)
+- **Quit**: Stop the current workflow (feedback optional)
+
+**💡 Edit Feedback Examples:**
+- "search for high pressure troubleshooting methods"
+- "get historical temperature data for last month"
+- "find pump noise diagnostic procedures"
+- "check for recent alarm logs and error codes"
+- "look up calibration procedures for pressure sensors"
+"""
+
+# Agent emojis (single code points) that show a message as info; set.isdisjoint scans the message once
+_AGENT_EMOJIS = frozenset("🧠🔧📊📖🤔🧬")
+# Plan listings, shown as plain text even when a step mentions errors
+_PLAN_MESSAGE_RE = re.compile('Remaining plan steps|Current plan|SCADA: Check error codes')
+
+# Section markers of the synthesized answer (see SYNTHESIZER_SYSTEM_PROMPT's format)
+_SECTION_RE = re.compile('(📊|📘|💡|⚠️)')
+
 # Page config
 st.set_page_config(
     page_title="SentientGrid - Terminal View",
@@ -38,24 +127,40 @@ if 'query_input' not in st.session_state:
 if 'feedback_input' not in st.session_state:
     st.session_state.feedback_input = ""
 
-def call_api(endpoint: str, method: str = "GET", data: Optional[Dict] = None):
+@st.cache_resource
+def get_api_session() -> requests.Session:
+    """
+    One pooled keep-alive session per Streamlit process. The script body re-runs on every
+    interaction, so a plain module-level Session would be rebuilt (and reconnect) each rerun.
+    """
+    session = requests.Session()
+    # No automatic retries: a failed poll should fail fast, the next rerun polls again
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0))
+    return session
+
+def call_api(endpoint: str, method: str = "GET", data: Optional[Dict] = None, timeout: Optional[tuple] = None):
     """API call function with better error handling"""
+    # (connect, read) seconds. GETs are the frequent status/terminal polls, so a hung server
+    # must not stall the whole rerun; commands get more room
+    if timeout is None:
+        timeout = POLL_TIMEOUT if method == "GET" else COMMAND_TIMEOUT
     try:
         # Use Docker service name when running in container, localhost when running locally
         api_host = os.environ.get('API_HOST', 'localhost')
         url = f"http://{api_host}:8000{endpoint}"
         headers = {}
         
-        # Add API key to headers if available
+        # Add API key to headers if available (per request: the session is shared by all browser sessions)
         if st.session_state.groq_api_key:
             headers["X-Groq-API-Key"] = st.session_state.groq_api_key
         
+        session = get_api_session()
         if method == "GET":
-            response = requests.get(url, timeout=10, headers=headers)
+            response = session.get(url, timeout=timeout, headers=headers)
         elif method == "POST":
-            response = requests.post(url, json=data, timeout=10, headers=headers)
+            response = session.post(url, json=data, timeout=timeout, headers=headers)
         elif method == "DELETE":
-            response = requests.delete(url, timeout=10, headers=headers)
+            response = session.delete(url, timeout=timeout, headers=headers)
         else:
             st.error(f"Unsupported method: {method}")
             return None
@@ -103,13 +208,7 @@ def send_human_decision(choice: str, feedback: str = None):
         st.session_state.feedback_input = ""
 
         # Show what the choice means
-        choice_meanings = {
-            "c": "Continue with current plan (feedback modifies existing steps)",
-            "e": "Edit plan using feedback (replaces with new AI-generated plan)",
-            "s": "Synthesize final answer now (incorporates feedback if provided)",
-            "q": "Quit the workflow"
-        }
-        st.info(f"📋 Action: {choice_meanings.get(choice, 'Unknown action')}")
+        st.info(f"📋 Action: {_CHOICE_MEANINGS.get(choice, 'Unknown action')}")
 
         # Show feedback if provided (only if it's different from previous)
         if feedback and feedback.strip():
@@ -126,6 +225,30 @@ def send_human_decision(choice: str, feedback: str = None):
             st.error("❌ Failed to send decision")
         return False
 
+def merge_terminal_output(terminal_response):
+    """
+    Fold an /api/state terminal payload into st.session_state.terminal_data. Deltas are appended;
+    a full snapshot, or a delta after the server cleared its output (new start_seq) or restarted
+    (new epoch), replaces it.
+    """
+    terminal_data = st.session_state.terminal_data
+    if (
+        not terminal_response.get("is_delta")
+        or terminal_response.get("start_seq") != terminal_data.get("start_seq")
+        or terminal_response.get("epoch") != terminal_data.get("epoch")
+    ):
+        terminal_data = {"terminal_output": [], "general_output": [], "iterations": {}}
+
+    terminal_data["terminal_output"].extend(terminal_response.get("terminal_output", []))
+    terminal_data["general_output"].extend(terminal_response.get("general_output", []))
+    for iteration, entries in terminal_response.get("iterations", {}).items():
+        terminal_data["iterations"].setdefault(iteration, []).extend(entries)
+    terminal_data["current_iteration"] = terminal_response.get("current_iteration", 0)
+    terminal_data["start_seq"] = terminal_response.get("start_seq")
+    terminal_data["next_seq"] = terminal_response.get("next_seq")
+    terminal_data["epoch"] = terminal_response.get("epoch")
+    st.session_state.terminal_data = terminal_data
+
 def get_conversation_history():
     """Get conversation history from API"""
     try:
@@ -140,70 +263,89 @@ def update_conversation_history():
     """Update conversation history from API"""
     st.session_state.conversation_history = get_conversation_history()
 
+@functools.lru_cache(maxsize=4096)
 def is_important_message(message):
     """Check if message is important enough to show"""
-    # Skip debug and HTTP log messages
-    skip_patterns = [
-        "Still waiting",
-        "127.0.0.1",
-        "HTTP/1.1",
-        "INFO:",
-        "GET /api",
-        "POST /api",
-        "--- Execution Loop Iteration",
-        "--- Executor Step ---",
-        "ExecutorAgent: Executing step:",
-        "ScadaAgent: Querying SCADA",
-        "ManualAgent: Searching manuals",
-        "ScadaAgent: SCADA query successful",
-        "ManualAgent: Manual search successful"
-    ]
-    
-    for pattern in skip_patterns:
-        if pattern in message:
-            return False
-    return True
-
-def format_message_simple(entry):
-    """Format message in a simple, clean way"""
-    msg_type = entry.get('type', 'info')
-    message = entry.get('message', '')
-    timestamp = entry.get('timestamp', '')
-    
-    # Skip unimportant messages
-    if not is_important_message(message):
-        return
-    
-    # Clean up message (remove timestamps)
-    clean_message = message.strip()
-    
-    # Remove leading timestamp pattern like "**00:48:01**"
-    import re
-    clean_message = re.sub(r'^\*\*\d{2}:\d{2}:\d{2}\*\*\s*', '', clean_message)
-    
+    # Memoized: every rerun re-renders the same terminal entries, and each entry is checked twice
+    return _SKIP_RE.search(message) is None
+
+def split_answer_sections(answer):
+    """Map each section emoji of the synthesized answer to its text, in one pass over the answer"""
+    parts = _SECTION_RE.split(answer)
+    sections = {}
+    # parts = [preamble, marker, text, marker, text, ...]; the first occurrence of a marker wins
+    for marker, text in zip(parts[1::2], parts[2::2]):
+        sections.setdefault(marker, text.strip())
+    return sections
+
+def ellipsize(text, limit):
+    """text cut to `limit` characters with "..." appended when it is longer"""
+    return text if len(text) <= limit else text[:limit] + "..."
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def format_turn(user_query, timestamp, diagnostic_steps, context_summary):
+    """
+    Display strings for one conversation turn. Turns are append-only, so after the first
+    render every earlier turn is a cache hit (diagnostic_steps is passed as a tuple so it hashes).
+    """
+    return {
+        "title": f"{user_query[:50]}...",
+        "query_md": f"**Query:** {user_query}",
+        "time_md": f"**Time:** {timestamp[:19]}",
+        "steps_count_md": f"**Steps:** {len(diagnostic_steps)}",
+        "steps": [
+            (f"{j+1}. **{step}**", ellipsize(result, 200))
+            for j, (step, result) in enumerate(diagnostic_steps)
+        ],
+    }
+
+def render_message(clean_message):
+    """Display a cleaned terminal message in a simple, clean way"""
     # Format based on content and type
+    is_plan_message = _PLAN_MESSAGE_RE.search(clean_message) is not None
     if "✅" in clean_message or "SUCCESS" in clean_message.upper():
         st.success(clean_message)
     elif "⚠️" in clean_message or "WARNING" in clean_message.upper():
         st.warning(clean_message)
-    elif ("❌" in clean_message or "ERROR" in clean_message.upper()) and "Remaining plan steps" not in clean_message and "Current plan" not in clean_message and "SCADA: Check error codes" not in clean_message:
+    elif ("❌" in clean_message or "ERROR" in clean_message.upper()) and not is_plan_message:
         st.error(clean_message)
     elif "👤" in clean_message or "Human decision" in clean_message:
         st.info(clean_message)
-    elif any(emoji in clean_message for emoji in ["🧠", "🔧", "📊", "📖", "🤔", "🧬"]):
+    elif not _AGENT_EMOJIS.isdisjoint(clean_message):
         st.info(clean_message)
-    elif "Remaining plan steps" in clean_message or "Current plan" in clean_message or "SCADA: Check error codes" in clean_message:
+    elif is_plan_message:
         st.text(clean_message)  # Display plan-related messages as plain text
     else:
         st.text(clean_message)
 
-def group_messages_by_stage(entries):
-    """Group messages by workflow stage"""
-    planner_messages = []
-    replan_messages = []
-    human_loop_messages = []
-    synthesizer_messages = []
-    other_messages = []
+# Stage sections in display order (general workflow first): stage -> (heading, separator after the box)
+_STAGES = {
+    "other": (None, False),
+    "planner": ("#### 🧠 Planner Agent", True),
+    "replan": ("#### 🤔 Replan Agent", True),
+    "human_loop": ("#### 🤝 Human In The Loop", True),
+    "synthesizer": ("#### 🧬 Synthesized Answer", False),
+}
+
+# Markers that switch the current stage, one named group per stage in priority order.
+# Executor messages go back to the general flow ("other").
+_STAGE_RE = re.compile(
+    r'(?P<planner>Planner Step|PlannerAgent|Plan created)'
+    r'|(?P<replan>Replan Step|ReplanAgent)'
+    r'|(?P<human_loop>HUMAN IN THE LOOP|Waiting for human decision|Human decision received)'
+    r'|(?P<synthesizer>Synthesizer Step|SynthesizerAgent)'
+    r'|(?P<other>Executor Step|ExecutorAgent)'
+)
+_STAGE_PRIORITY = ["planner", "replan", "human_loop", "synthesizer", "other"]
+
+def render_messages_by_stage(entries):
+    """
+    Show messages grouped by workflow stage in a single pass: each stage gets a container
+    up front (so the display order stays fixed) and every entry is filtered, cleaned and
+    written straight into its stage's container.
+    """
+    containers = {stage: st.container() for stage in _STAGES}
+    shown_stages = set()
     
     current_stage = "other"
     
@@ -215,48 +357,32 @@ def group_messages_by_stage(entries):
             continue
         
         # Skip detailed human loop text - keep only essential parts
-        if any(skip in message for skip in [
-            "--- HUMAN IN THE LOOP: Review Required ---",
-            "Current State Overview:",
-            "User Query:",
-            "Result Preview:",
-            "Options:",
-            "'c' / 'continue':",
-            "'s' / 'synthesize':",
-            "'e' / 'edit':",
-            "'q' / 'quit':"
-        ]):
+        if _HUMAN_SKIP_RE.search(message):
             continue
         
         # Skip final diagnostic answer from workflow stages (it will be shown separately)
         if "FINAL DIAGNOSTIC ANSWER" in message or "COMPREHENSIVE DIAGNOSTIC ANALYSIS" in message:
             continue
             
-        # Determine stage based on content
-        if "Planner Step" in message or "PlannerAgent" in message or "Plan created" in message:
-            current_stage = "planner"
-        elif "Replan Step" in message or "ReplanAgent" in message:
-            current_stage = "replan"
-        elif "HUMAN IN THE LOOP" in message or "Waiting for human decision" in message or "Human decision received" in message:
-            current_stage = "human_loop"
-        elif "Synthesizer Step" in message or "SynthesizerAgent" in message:
-            current_stage = "synthesizer"
-        elif "Executor Step" in message or "ExecutorAgent" in message:
-            current_stage = "other"  # Keep executor in general flow
+        # Determine stage based on content (one scan; earlier groups in _STAGE_RE win ties)
+        matched_stages = {match.lastgroup for match in _STAGE_RE.finditer(message)}
+        if matched_stages:
+            current_stage = min(matched_stages, key=_STAGE_PRIORITY.index)
         
-        # Add to appropriate group
-        if current_stage == "planner":
-            planner_messages.append(entry)
-        elif current_stage == "replan":
-            replan_messages.append(entry)
-        elif current_stage == "human_loop":
-            human_loop_messages.append(entry)
-        elif current_stage == "synthesizer":
-            synthesizer_messages.append(entry)
-        else:
-            other_messages.append(entry)
+        with containers[current_stage]:
+            # Stage heading before the stage's first message
+            if current_stage not in shown_stages:
+                shown_stages.add(current_stage)
+                heading = _STAGES[current_stage][0]
+                if heading:
+                    st.markdown(heading)
+            # Remove leading timestamp pattern like "**00:48:01**"
+            render_message(_TS_RE.sub('', message.strip(), count=1))
     
-    return planner_messages, replan_messages, human_loop_messages, synthesizer_messages, other_messages
+    # Separator after each agent box except the synthesized answer
+    for stage, (_, separator) in _STAGES.items():
+        if separator and stage in shown_stages:
+            containers[stage].markdown("---")
 
 # Main interface
 st.title("🔧 SentientGrid - Diagnostic System")
@@ -313,6 +439,20 @@ else:
             st.session_state.groq_api_key = ""
             st.rerun()
 
+# Fetch status, terminal output and conversation history in one request per rerun;
+# the sidebar and the main page all read from it
+# Terminal output comes as a delta: only lines after the cursor of what is already shown
+terminal_cursor = st.session_state.terminal_data.get("next_seq")
+terminal_epoch = st.session_state.terminal_data.get("epoch")
+api_state = call_api(
+    "/api/state" if terminal_cursor is None else f"/api/state?since={terminal_cursor}&epoch={terminal_epoch}"
+)
+status = api_state["status"] if api_state else None
+terminal_response = api_state["terminal"] if api_state else None
+if api_state:
+    st.session_state.conversation_history = api_state["conversation_history"]
+is_processing = status.get('is_processing', False) if status else False
+
 # Only show main interface if API key is configured
 if st.session_state.api_key_set:
     # Sidebar for system status
@@ -321,8 +461,8 @@ if st.session_state.api_key_set:
     
                 # Test connection
         if st.button("🔍 Test Connection"):
-            status = call_api("/api/status")
-            if status:
+            # Fresh request on purpose: this button is the explicit connectivity check
+            if call_api("/api/status"):
                 st.success("✅ API Connected")
             else:
                 st.error("❌ API Not Connected")
@@ -335,10 +475,10 @@ if st.session_state.api_key_set:
             if st.session_state.conversation_history:
                 last_turn = st.session_state.conversation_history[-1]
                 st.markdown("**Last Query:**")
-                st.text(last_turn['user_query'][:50] + "..." if len(last_turn['user_query']) > 50 else last_turn['user_query'])
+                st.text(ellipsize(last_turn['user_query'], 50))
                 
                 st.markdown("**Last Findings:**")
-                st.text(last_turn['context_summary'][:100] + "..." if len(last_turn['context_summary']) > 100 else last_turn['context_summary'])
+                st.text(ellipsize(last_turn['context_summary'], 100))
         
         # Clear history
         if st.button("🗑️ Clear History"):
@@ -350,7 +490,6 @@ if st.session_state.api_key_set:
                 st.error("❌ Failed to clear history")
     
     # System info
-    status = call_api("/api/status")
     if status:
         if status.get('is_processing'):
             st.success("🟢 Processing Query")
@@ -362,10 +501,6 @@ if st.session_state.api_key_set:
     else:
         st.error("🔴 API Offline")
 
-# Get current status for the entire page
-status = call_api("/api/status")
-is_processing = status.get('is_processing', False) if status else False
-
 # Main content area
 col1, col2 = st.columns([3, 1])
 
@@ -410,24 +545,10 @@ with col1:
 with col2:
     st.header("🎯 Quick Examples")
     
-    examples = [
-        "Pressure is high, what should I do?",
-        "What's the pressure in March?",
-        "Check SCADA readings",
-        "Find troubleshooting procedures"
-    ]
-    
     # Add follow-up examples if in a conversation
     if st.session_state.conversation_history:
         st.markdown("**💬 Follow-up Examples:**")
-        follow_up_examples = [
-            "What about the temperature data from my last query?",
-            "Check the pressure trends we discussed earlier",
-            "Compare with previous results",
-            "What else should I check?"
-        ]
-        
-        for example in follow_up_examples:
+        for example in _FOLLOW_UP_EXAMPLES:
             if st.button(example, key=f"followup_{example}", disabled=is_processing):
                 st.session_state.query_input = example
                 st.rerun()
@@ -435,19 +556,14 @@ with col2:
         st.markdown("---")
         st.markdown("**🔍 New Queries:**")
     
-    for example in examples:
+    for example in _EXAMPLES:
         if st.button(example, key=f"ex_{example}", disabled=is_processing):
             st.session_state.query_input = example
             st.rerun()
 
-# Get terminal output and update display
-terminal_response = call_api("/api/terminal-output")
+# Update the terminal display from the state fetched above
 if terminal_response:
-    st.session_state.terminal_data = {
-        "general_output": terminal_response.get("general_output", []),
-        "iterations": terminal_response.get("iterations", {}),
-        "current_iteration": terminal_response.get("current_iteration", 0)
-    }
+    merge_terminal_output(terminal_response)
 
 # Update processing status
 if status:
@@ -473,79 +589,15 @@ terminal_data = st.session_state.terminal_data
 # Show general output (initialization, planning)
 if terminal_data.get("general_output"):
     with st.expander("🔧 System Initialization & Planning", expanded=True):
-        planner_msg, replan_msg, human_msg, synth_msg, other_msg = group_messages_by_stage(terminal_data["general_output"])
-        
-        # Show other messages first (general workflow)
-        for entry in other_msg:
-            format_message_simple(entry)
-        
-        # Show planner messages in separate box
-        if planner_msg:
-            st.markdown("#### 🧠 Planner Agent")
-            for entry in planner_msg:
-                format_message_simple(entry)
-            st.markdown("---")
-        
-        # Show replan messages in separate box  
-        if replan_msg:
-            st.markdown("#### 🤔 Replan Agent")
-            for entry in replan_msg:
-                format_message_simple(entry)
-            st.markdown("---")
-        
-        # Show human loop messages in separate box
-        if human_msg:
-            st.markdown("#### 🤝 Human In The Loop")
-            for entry in human_msg:
-                format_message_simple(entry)
-            st.markdown("---")
-        
-        # Show synthesizer messages in separate box
-        if synth_msg:
-            st.markdown("#### 🧬 Synthesized Answer")
-            for entry in synth_msg:
-                format_message_simple(entry)
+        render_messages_by_stage(terminal_data["general_output"])
 
 # Show execution iterations
 iterations = terminal_data.get("iterations", {})
 if iterations:
     for iteration_num in sorted(iterations.keys(), key=int):
-        iteration_entries = iterations[iteration_num]
         with st.expander(f"🔄 Execution Loop Iteration {iteration_num}", expanded=True):
-            
-            # Group iteration messages by stage
-            planner_msg, replan_msg, human_msg, synth_msg, other_msg = group_messages_by_stage(iteration_entries)
-            
-            # Show other messages first (executor, scada, manual)
-            for entry in other_msg:
-                format_message_simple(entry)
-            
-            # Show planner messages in separate box
-            if planner_msg:
-                st.markdown("#### 🧠 Planner Agent")
-                for entry in planner_msg:
-                    format_message_simple(entry)
-                st.markdown("---")
-            
-            # Show replan messages in separate box  
-            if replan_msg:
-                st.markdown("#### 🤔 Replan Agent")
-                for entry in replan_msg:
-                    format_message_simple(entry)
-                st.markdown("---")
-            
-            # Show human loop messages in separate box
-            if human_msg:
-                st.markdown("#### 🤝 Human In The Loop")
-                for entry in human_msg:
-                    format_message_simple(entry)
-                st.markdown("---")
-            
-            # Show synthesizer messages in separate box
-            if synth_msg:
-                st.markdown("#### 🧬 Synthesized Answer")
-                for entry in synth_msg:
-                    format_message_simple(entry)
+            # Executor, SCADA and manual messages first, then one box per agent stage
+            render_messages_by_stage(iterations[iteration_num])
 
 elif st.session_state.is_processing:
     st.info("**Output will appear here as the system processes your query...**")
@@ -553,100 +605,93 @@ else:
     st.info("**No active processing. Submit a query to see diagnostic output.**")
 
 # Human Decision Interface - Show only when system is awaiting decision
-if st.session_state.awaiting_decision:
-    st.header("🤝 Human Decision Required")
-    st.warning("🔄 **The system is waiting for your decision!** Please choose an action below.")
-
-    # Natural Language Feedback Input
-    st.subheader("💬 Natural Language Feedback")
-
-    def update_feedback_input():
-        st.session_state.feedback_input = st.session_state.feedback_input_widget
-
-    feedback_input = st.text_area(
-        "Provide additional instructions or feedback:",
-        value=st.session_state.feedback_input,
-        key="feedback_input_widget",
-        placeholder="e.g., 'search for high pressure troubleshooting methods', 'get historical temperature data', 'find pump noise procedures'...",
-        height=80,
-        help="🔤 Optional for Continue, Synthesize, Quit. 🔴 Required for Edit (creates new plan).",
-        on_change=update_feedback_input
-    )
+@st.fragment
+def human_decision_interface():
+    """
+    Decision form as a fragment: typing feedback or clicking a button here reruns only this
+    block instead of re-fetching the API state and re-rendering the whole terminal output.
+    A sent decision still triggers a full rerun (send_human_decision calls st.rerun()).
+    """
+    if st.session_state.awaiting_decision:
+        st.header("🤝 Human Decision Required")
+        st.warning("🔄 **The system is waiting for your decision!** Please choose an action below.")
+
+        # Natural Language Feedback Input
+        st.subheader("💬 Natural Language Feedback")
+
+        def update_feedback_input():
+            st.session_state.feedback_input = st.session_state.feedback_input_widget
+
+        feedback_input = st.text_area(
+            "Provide additional instructions or feedback:",
+            value=st.session_state.feedback_input,
+            key="feedback_input_widget",
+            placeholder="e.g., 'search for high pressure troubleshooting methods', 'get historical temperature data', 'find pump noise procedures'...",
+            height=80,
+            help="🔤 Optional for Continue, Synthesize, Quit. 🔴 Required for Edit (creates new plan).",
+            on_change=update_feedback_input
+        )
 
-    # Decision buttons - Only shown when decision is required
-    st.subheader("🎯 Choose Action")
-    decision_col1, decision_col2, decision_col3, decision_col4 = st.columns(4)
+        # Decision buttons - Only shown when decision is required
+        st.subheader("🎯 Choose Action")
+        decision_col1, decision_col2, decision_col3, decision_col4 = st.columns(4)
 
-    with decision_col1:
-        if st.button("▶️ Continue", key="btn_continue", type="primary"):
-            send_human_decision("c", feedback_input)
+        with decision_col1:
+            if st.button("▶️ Continue", key="btn_continue", type="primary"):
+                send_human_decision("c", feedback_input)
 
-    with decision_col2:
-        if st.button("✏️ Edit", key="btn_edit"):
-            if feedback_input and feedback_input.strip():
-                send_human_decision("e", feedback_input)
-            else:
-                st.warning("⚠️ Please provide feedback in the text area above before clicking Edit.")
-
-    with decision_col3:
-        if st.button("🔬 Synthesize", key="btn_synthesize", type="secondary"):
-            send_human_decision("s", feedback_input)
-
-    with decision_col4:
-        if st.button("🛑 Quit", key="btn_quit"):
-            send_human_decision("q", feedback_input)
-
-    # Enhanced helpful info
-    st.info("""
-    **Decision Interface:**
-    - **Continue**: Proceed with the current plan (feedback optional - adds to existing plan)
-    - **✏️ Edit**: Replace current plan with new AI-generated plan (feedback required)
-    - **Synthesize**: Force the system to provide a final answer now (feedback optional)
-    - **Quit**: Stop the current workflow (feedback optional)
-
-    **💡 Edit Feedback Examples:**
-    - "search for high pressure troubleshooting methods"
-    - "get historical temperature data for last month"
-    - "find pump noise diagnostic procedures"
-    - "check for recent alarm logs and error codes"
-    - "look up calibration procedures for pressure sensors"
-    """)
-elif st.session_state.is_processing and not st.session_state.awaiting_decision:
-    st.header("🤝 Human Decision Interface")
-    st.info("⏳ **System is processing your query...** The decision interface will appear when your input is needed.")
-else:
-    st.header("🤝 Human Decision Interface")
-    st.info("💡 **Submit a query above** to start the diagnostic process. The decision interface will appear when your input is needed.")
+        with decision_col2:
+            if st.button("✏️ Edit", key="btn_edit"):
+                if feedback_input and feedback_input.strip():
+                    send_human_decision("e", feedback_input)
+                else:
+                    st.warning("⚠️ Please provide feedback in the text area above before clicking Edit.")
+
+        with decision_col3:
+            if st.button("🔬 Synthesize", key="btn_synthesize", type="secondary"):
+                send_human_decision("s", feedback_input)
 
+        with decision_col4:
+            if st.button("🛑 Quit", key="btn_quit"):
+                send_human_decision("q", feedback_input)
 
+        # Enhanced helpful info
+        st.info(_DECISION_HELP)
+    elif st.session_state.is_processing and not st.session_state.awaiting_decision:
+        st.header("🤝 Human Decision Interface")
+        st.info("⏳ **System is processing your query...** The decision interface will appear when your input is needed.")
+    else:
+        st.header("🤝 Human Decision Interface")
+        st.info("💡 **Submit a query above** to start the diagnostic process. The decision interface will appear when your input is needed.")
+
+human_decision_interface()
 
 # Footer
 st.markdown("---")
 
-# Check for final diagnostic answer
+# Check for final diagnostic answer (in the accumulated terminal output)
 final_answer = None
-terminal_response = call_api("/api/terminal-output")
-if terminal_response:
-    terminal_output = terminal_response.get('terminal_output', [])
-    
-    # Look for final answer
-    collecting_answer = False
+terminal_output = st.session_state.terminal_data.get('terminal_output', [])
+if terminal_output:
+    # Look for final answer: it is printed at the end, so scan back from the newest line and
+    # stop at the header. Lines after a "====" rule are outside the answer block.
     answer_parts = []
+    found_answer = False
     
-    for entry in terminal_output:
+    for entry in reversed(terminal_output):
         message = entry.get('message', '')
         
         if "FINAL DIAGNOSTIC ANSWER" in message:
-            collecting_answer = True
-            continue
+            found_answer = True
+            break
         
-        if collecting_answer:
-            if "====" in message:
-                break
-            if message.strip():
-                answer_parts.append(message.strip())
+        if "====" in message:
+            answer_parts = []
+        elif message.strip():
+            answer_parts.append(message.strip())
     
-    if answer_parts:
+    if found_answer and answer_parts:
+        answer_parts.reverse()
         final_answer = "\n".join(answer_parts)
 
 # Show final results if available
@@ -654,29 +699,22 @@ if final_answer:
     st.header("📊 Diagnostic Results")
     
     # Parse the answer into clean sections
-    sections = final_answer.split('📊')
-    if len(sections) > 1:
-        data_section = sections[1].split('📘')[0].strip()
+    sections = split_answer_sections(final_answer)
+    if '📊' in sections:
         st.markdown("#### 📊 What We Found")
-        st.info(data_section)
+        st.info(sections['📊'])
     
-    sections = final_answer.split('📘')
-    if len(sections) > 1:
-        procedure_section = sections[1].split('💡')[0].strip()
+    if '📘' in sections:
         st.markdown("#### 📘 Relevant Procedures")
-        st.info(procedure_section)
+        st.info(sections['📘'])
     
-    sections = final_answer.split('💡')
-    if len(sections) > 1:
-        recommendations_section = sections[1].split('⚠️')[0].strip()
+    if '💡' in sections:
         st.markdown("#### 💡 Our Recommendations")
-        st.success(recommendations_section)
+        st.success(sections['💡'])
     
-    sections = final_answer.split('⚠️')
-    if len(sections) > 1:
-        priority_section = sections[1].strip()
+    if '⚠️' in sections:
         st.markdown("#### ⚠️ Priority Actions")
-        st.warning(priority_section)
+        st.warning(sections['⚠️'])
     
     # Reset button for new analysis
     if st.button("🔄 Start New Analysis", type="primary"):
@@ -691,28 +729,31 @@ if final_answer:
 # Conversation History Section
 st.header("💬 Conversation History")
 
-# Update conversation history
-update_conversation_history()
-
 if st.session_state.conversation_history:
     for i, turn in enumerate(st.session_state.conversation_history):
-        with st.expander(f"Turn {i+1}: {turn['user_query'][:50]}...", expanded=False):
+        turn_text = format_turn(
+            turn['user_query'],
+            turn['timestamp'],
+            tuple(tuple(step_result) for step_result in turn['diagnostic_steps']),
+            turn['context_summary']
+        )
+        with st.expander(f"Turn {i+1}: {turn_text['title']}", expanded=False):
             col1, col2 = st.columns([1, 3])
             
             with col1:
-                st.markdown(f"**Query:** {turn['user_query']}")
-                st.markdown(f"**Time:** {turn['timestamp'][:19]}")
-                st.markdown(f"**Steps:** {len(turn['diagnostic_steps'])}")
+                st.markdown(turn_text['query_md'])
+                st.markdown(turn_text['time_md'])
+                st.markdown(turn_text['steps_count_md'])
             
             with col2:
                 st.markdown("**Key Findings:**")
                 st.info(turn['context_summary'])
                 
-                if turn['diagnostic_steps']:
+                if turn_text['steps']:
                     st.markdown("**Diagnostic Steps:**")
-                    for j, (step, result) in enumerate(turn['diagnostic_steps']):
-                        st.markdown(f"{j+1}. **{step}**")
-                        st.text(result[:200] + "..." if len(result) > 200 else result)
+                    for step_md, result_preview in turn_text['steps']:
+                        st.markdown(step_md)
+                        st.text(result_preview)
     
     # Conversation management
     col1, col2 = st.columns(2)